@@ -1,47 +1,110 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime, date, timedelta
-import asyncio
-import aiohttp
-from supabase import create_client, Client
-from fetch_bill_charges import fetch_bill_charges
-import json
+import os
+from sync_jobs import enqueue_sync_job, get_job
+from report_cache import (
+    get_supabase, data_version, invalidate, cached_summary, cached_sales_by_store,
+    cached_sales_series, cached_browse_page, cached_browse_count
+)
+from bill_charges_store import BROWSE_COLUMNS, DEFAULT_BROWSE_COLUMNS, BROWSE_PAGE_SIZE
+from reports import CENTS
+from trends import GRAINS, change, full_periods, previous_range, with_deltas
 from postgrest.exceptions import APIError
 
-# Initialize Supabase client
-supabase: Client = create_client(
-    st.secrets["SUPABASE_URL"],
-    st.secrets["SUPABASE_KEY"]
-)
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), 'schema.sql')
 
-# Try to access the table, if it doesn't exist, we'll catch the error
+# Supabase client, shared by every session
+supabase = get_supabase()
+
+# Try to access the tables, if they don't exist, we'll catch the error
 try:
-    supabase.table('bill_charges').select("*").limit(1).execute()
+    supabase.table('bill_charges').select("charge_key").limit(1).execute()
+    supabase.table('sync_state').select("*").limit(1).execute()
+    supabase.table('sync_jobs').select("id").limit(1).execute()
+    supabase.table('bill_charges_daily').select("day").limit(1).execute()
+    supabase.rpc('bill_charges_summary', {'range_start': date.today().isoformat(), 'range_end': date.today().isoformat()}).execute()
 except APIError as e:
-    if 'relation "public.bill_charges" does not exist' in str(e):
-        st.error("The bill_charges table doesn't exist in your Supabase database. Please create it using the following SQL in the Supabase SQL editor:")
-        st.code("""
-CREATE TABLE IF NOT EXISTS bill_charges (
-    id SERIAL PRIMARY KEY,
-    quote_id TEXT,
-    customer_id TEXT,
-    customer_name TEXT,
-    customer_taxvat TEXT,
-    customer_email TEXT,
-    store_name TEXT,
-    total_amount NUMERIC,
-    installments INTEGER,
-    paid_at TIMESTAMPTZ,
-    due_at TIMESTAMPTZ,
-    is_paid BOOLEAN,
-    payment_method TEXT,
-    status TEXT,
-    quote_items TEXT,
-    created_at TIMESTAMPTZ DEFAULT NOW()
-);
-        """, language="sql")
+    if 'does not exist' in str(e) or 'Could not find the function' in str(e):
+        st.error("The bill_charges tables or report functions are missing or outdated in your Supabase database. Please run the following SQL in the Supabase SQL editor:")
+        with open(SCHEMA_PATH) as f:
+            st.code(f.read(), language="sql")
         st.stop()
 
+
+@st.fragment(run_every="2s")
+def show_sync_job():
+    """Poll the job enqueued by this session until it finishes."""
+    job_id = st.session_state.get('sync_job_id')
+    if job_id is None:
+        return
+
+    job = get_job(supabase, job_id)
+    if job is None or job['status'] == 'done':
+        del st.session_state['sync_job_id']
+        invalidate()
+        # Rerun the whole page so the report picks up the new rows
+        st.rerun()
+    elif job['status'] == 'failed':
+        st.error(f"A sincronização falhou: {job['error']}. Clique em \"Baixar Relatório\" para retomar de onde parou.")
+    elif job['status'] == 'queued':
+        st.info("⏳ Sincronização na fila, aguardando o worker...")
+    else:
+        progress = job['pages_done'] / job['pages_total'] if job['pages_total'] else 0.0
+        st.progress(min(progress, 1.0), text=job['message'] or "Sincronizando...")
+
+
+@st.fragment
+def show_results_browser(start_date, end_date, version, store_names):
+    """Page through the stored rows; only the visible page and columns are fetched."""
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        stores = st.multiselect("Loja", store_names)
+    with col2:
+        paid = st.selectbox("Pagamento", ["Todos", "Pagos", "Não pagos"])
+    with col3:
+        customer = st.text_input("Cliente contém")
+    columns = st.multiselect("Colunas", BROWSE_COLUMNS, default=DEFAULT_BROWSE_COLUMNS)
+    if not columns:
+        st.info("Selecione ao menos uma coluna.")
+        return
+
+    filters = (
+        ('store_names', tuple(stores)),
+        ('is_paid', {"Todos": None, "Pagos": True, "Não pagos": False}[paid]),
+        ('customer', customer.strip()),
+    )
+
+    # Keyset cursors: cursors[n] is the last id before page n. Any change to
+    # the range, data or filters starts over from the first page
+    browse_key = (start_date, end_date, version, filters)
+    if st.session_state.get('browse_key') != browse_key:
+        st.session_state['browse_key'] = browse_key
+        st.session_state['browse_cursors'] = [None]
+    cursors = st.session_state['browse_cursors']
+
+    total = cached_browse_count(start_date, end_date, version, filters)
+    pages = max(1, -(-total // BROWSE_PAGE_SIZE))
+    page = len(cursors) - 1
+    rows = cached_browse_page(start_date, end_date, version, tuple(columns), filters, cursors[-1])
+
+    df = pd.DataFrame(rows, columns=['id', *columns]).set_index('id')
+    if 'total_amount' in df:
+        df['total_amount'] = df['total_amount'] / CENTS
+    st.dataframe(df, hide_index=True, column_config={
+        'total_amount': st.column_config.NumberColumn("Valor", format="R$ %.2f"),
+    })
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        st.button("◀ Anterior", disabled=page == 0, on_click=cursors.pop)
+    with col2:
+        st.caption(f"Página {page + 1} de {pages} · {total} registros")
+    with col3:
+        st.button("Próxima ▶", disabled=len(rows) < BROWSE_PAGE_SIZE or page + 1 >= pages,
+                  on_click=cursors.append, args=(rows[-1]['id'] if rows else None,))
+
+
 # Page config
 st.set_page_config(
     page_title="COC - Relatório de Vendas",
@@ -79,111 +142,74 @@ if password == correct_password:
     if date_range > 90:
         st.warning("")
     
+    sync_mode = st.radio(
+        "Sincronização",
+        ["Incremental", "Completa"],
+        horizontal=True,
+        help="Incremental baixa apenas as vendas novas desde a última sincronização deste período."
+    )
+
     if st.button("Baixar Relatório "):
-        try:
-            with st.spinner("Por favor aguarde, estamos baixando os dados"):
-                # Clear existing data
-                clear_result = supabase.table('bill_charges').delete().neq('id', 0).execute()
-                st.write("")
-                
-                # Fetch new data
-                async def fetch_data():
-                    async with aiohttp.ClientSession() as session:
-                        token = st.secrets["TOKEN"]
-                        bill_charges = await fetch_bill_charges(session, start_date.isoformat(), end_date.isoformat(), token)
-                        return bill_charges
-
-                # Run the async function
-                bill_charges = asyncio.run(fetch_data())
-                
-                if bill_charges is None:
-                    st.error("Failed to fetch data from the API. Please check the logs for details.")
-                elif not bill_charges:
-                    st.warning(f"No records found between {start_date} and {end_date}")
-                else:
-                    total_records = len(bill_charges)
-                    st.write(f"Processing {total_records} records...")
-                    
-                    # Create progress bar
-                    progress_bar = st.progress(0)
-                    
-                    # Transform data in batches
-                    BATCH_SIZE = 100
-                    transformed_data = []
-                    
-                    for i, charge in enumerate(bill_charges):
-                        quote = charge['quote']
-                        customer = quote['customer']
-                        store = charge['store']
-                        
-                        record = {
-                            'quote_id': quote['id'],
-                            'customer_id': customer['id'],
-                            'customer_name': customer['name'],
-                            'customer_taxvat': customer.get('taxvat'),
-                            'customer_email': customer.get('email'),
-                            'store_name': store['name'],
-                            'total_amount': charge['amount'],
-                            'installments': quote['bill'].get('installmentsQuantity'),
-                            'paid_at': charge.get('paidAt'),
-                            'due_at': charge.get('dueAt'),
-                            'is_paid': charge['isPaid'],
-                            'payment_method': charge['paymentMethod']['name'],
-                            'status': quote['status'],
-                            'quote_items': json.dumps(quote['bill']['items'])
-                        }
-                        transformed_data.append(record)
-                        
-                        # Update progress
-                        progress = (i + 1) / total_records
-                        progress_bar.progress(progress)
-                        
-                        # Batch insert when we reach BATCH_SIZE
-                        if len(transformed_data) >= BATCH_SIZE:
-                            supabase.table('bill_charges').insert(transformed_data).execute()
-                            transformed_data = []
-                    
-                    # Insert any remaining records
-                    if transformed_data:
-                        supabase.table('bill_charges').insert(transformed_data).execute()
-                    
-                    # Create DataFrame for display
-                    df = pd.DataFrame(bill_charges)
-                    df = pd.json_normalize(bill_charges, sep='_')
-                    
-                    # Convert amount to proper format
-                    # df['amount'] = df['amount'].astype(str).str.replace('.0', '', regex=False)
-                    df['amount'] = df['amount'].astype(float) / 100
-                    
-                    # Group by store and calculate total amount
-                    store_totals = df.groupby('store_name')['amount'].sum().reset_index()
-                    store_totals.columns = ['Loja', 'Total Vendas']
-                    store_totals['Total Vendas'] = store_totals['Total Vendas'].apply(lambda x: f'R$ {x:,.2f}')
-                    store_totals = store_totals.sort_values('Total Vendas', ascending=False)
-                    
-                    # Display success and statistics
-                    st.success(f"Successfully processed {total_records} records!")
-                    
-                    # Show statistics
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.metric("Total Records", total_records)
-                    with col2:
-                        total_amount = df['amount'].sum()
-                        st.metric("Total Amount", f"R$ {total_amount:,.2f}")
-                    with col3:
-                        paid_count = sum(1 for charge in bill_charges if charge['isPaid'])
-                        st.metric("Paid Records", f"{paid_count} ({(paid_count/total_records*100):.1f}%)")
-                    
-                    # Display the store totals
-                    st.subheader("Vendas por Loja")
-                    st.dataframe(store_totals, hide_index=True)
-                    # Display the dataframe
-                    st.dataframe(df)
-        
-        except Exception as e:
-            st.error(f"An error occurred: {str(e)}")
-            st.exception(e)
+        # The sync itself runs in sync_worker.py; clicks for a range already
+        # queued or running attach to that job instead of starting another
+        job = enqueue_sync_job(supabase, start_date, end_date, incremental=sync_mode == "Incremental")
+        st.session_state['sync_job_id'] = job['id']
+
+    show_sync_job()
+
+    # Report on everything stored for the range; Postgres does the aggregation
+    # and every session viewing the same range and data version shares the result
+    version = data_version()
+    summary = cached_summary(start_date, end_date, version)
+    total_records = summary['total_records']
+
+    if not total_records:
+        st.warning(f"No records found between {start_date} and {end_date}")
+    else:
+        # The same number of days just before the range, from the daily rollup
+        previous = cached_sales_series(*previous_range(start_date, end_date), version, 'month').sum()
+
+        # Show statistics
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Total Records", total_records,
+                      delta=change(total_records, previous['total_records']), help="vs. período anterior")
+        with col2:
+            st.metric("Total Amount", f"R$ {summary['total_amount']:,.2f}",
+                      delta=change(summary['total_amount'], previous['total_amount']), help="vs. período anterior")
+        with col3:
+            paid_count = summary['paid_count']
+            st.metric("Paid Records", f"{paid_count} ({(paid_count/total_records*100):.1f}%)")
+
+        # Display the store totals
+        by_store = cached_sales_by_store(start_date, end_date, version)
+        store_totals = by_store[['store_name', 'total_amount']]
+        store_totals.columns = ['Loja', 'Total Vendas']
+        store_totals['Total Vendas'] = store_totals['Total Vendas'].apply(lambda x: f'R$ {x:,.2f}')
+        st.subheader("Vendas por Loja")
+        st.dataframe(store_totals, hide_index=True)
+
+        # Trend per day, week or month, read from the daily rollup
+        if start_date < end_date:
+            st.subheader("Tendência")
+            col1, col2 = st.columns(2)
+            with col1:
+                grain = GRAINS[st.radio("Agrupamento", list(GRAINS), horizontal=True)]
+            with col2:
+                store = st.selectbox("Loja", ["Todas", *by_store['store_name'].dropna()])
+            series = cached_sales_series(start_date, end_date, version, grain, None if store == "Todas" else store)
+            series = full_periods(series[['total_amount', 'total_records']], start_date, end_date, grain)
+            st.bar_chart(series['total_amount'])
+
+            trend = with_deltas(series, ['total_amount', 'total_records'])
+            trend.index = trend.index.date
+            trend.columns = ['Total Vendas', 'Registros', 'Total Vendas Δ%', 'Registros Δ%']
+            st.dataframe(trend, column_config={
+                'Total Vendas': st.column_config.NumberColumn(format="R$ %.2f"),
+            })
+
+        st.subheader("Registros")
+        show_results_browser(start_date, end_date, version, by_store['store_name'].dropna().tolist())
 
 else:
     st.error("Please enter the correct password to access the application.")
\ No newline at end of file
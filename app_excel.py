@@ -4,20 +4,127 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, date
 import numpy as np
+from excel_ingest import read_sales_workbook
+from sales_analytics import build_store_cube, file_hash
+from sales_store import add_upload, has_upload, read_manifest, read_rollup, store_version
+from trends import GRAINS, change, full_periods, previous_range, resample, with_deltas
+from chart_data import PURPLE_SCALE, chart_series
 
 # Custom color palette
 COLORS = ['#3498db', '#2ecc71', '#e74c3c', '#f1c40f', '#9b59b6', '#1abc9c', '#e67e22', '#34495e']
+CACHE_ENTRIES = 32
 
-def generate_color_gradient(n_colors):
-    """Generate a gradient of purple colors."""
-    color_scale = []
-    for i in range(n_colors):
-        # Generate colors from light purple to dark purple
-        r = int(232 - (i * (232-128)/n_colors))  # From 232 to 128
-        g = int(232 - (i * (232-0)/n_colors))    # From 232 to 0
-        b = int(250 - (i * (250-128)/n_colors))  # From 250 to 128
-        color_scale.append(f'rgb({r},{g},{b})')
-    return color_scale
+def sales_bar_figure(sales, dim):
+    """Bar chart of value per `dim`, smallest first, from a Series indexed by dim."""
+    fig = go.Figure(data=[
+        go.Bar(
+            x=sales.index,
+            y=sales.values,
+            # Formatted and colored in the browser rather than one string per bar
+            texttemplate='R$ %{y:,.2f}',
+            textposition='auto',
+            marker=dict(color=np.arange(len(sales)), colorscale=PURPLE_SCALE, cmin=0, cmax=max(len(sales), 1))
+        )
+    ])
+    
+    fig.update_layout(
+        xaxis_title=dim,
+        yaxis_title='Valor líquido (R$)',
+        showlegend=False
+    )
+    return fig
+
+def procedimento_pie_figure(top_proc):
+    fig = go.Figure(data=[go.Pie(
+        labels=top_proc.index,
+        values=top_proc.values,
+        hole=.4,
+        textinfo='label+percent',
+        marker=dict(colors=COLORS)
+    )])
+    
+    fig.update_layout(
+        height=400,
+        showlegend=True,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    )
+    return fig
+
+# Cubes, aggregates and figures are shared by every session; the store
+# version and date range are the keys and old entries are evicted LRU. A cube
+# holds only its range, read with pushdown on Data venda, so memory follows
+# the ranges in use rather than the size of the store; year-over-year totals
+# come from the daily rollups instead of a second cube
+@st.cache_resource(max_entries=8, show_spinner="Carregando vendas...")
+def load_cube(version, start_date, end_date):
+    """Read only the range from the sales store; reruns reuse the cube."""
+    return build_store_cube(start_date, end_date)
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def range_report(version, start_date, end_date, _cube):
+    total_valor, total_vendas = _cube.totals(start_date, end_date)
+    return {
+        'total_valor': total_valor,
+        'total_vendas': total_vendas,
+        'unidade': _cube.by('Unidade', start_date, end_date)['valor'].rename('Valor líquido'),
+        'consultor': _cube.consultor_stats(start_date, end_date),
+        'procedimento': _cube.by('Procedimento', start_date, end_date)['valor'].rename('Valor líquido'),
+    }
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def range_rollup(version, start_date, end_date):
+    """Daily totals per Unidade and Consultor, read from the store's rollups."""
+    return read_rollup(start_date, end_date)
+
+def range_totals(version, start_date, end_date):
+    """(total value, number of sales) of a range, for period comparisons."""
+    daily = range_rollup(version, start_date, end_date)
+    return daily['valor'].sum(), int(daily['vendas'].sum())
+
+def show_trends(version, start_date, end_date):
+    """Series per day, week or month with the change against the previous period."""
+    daily = range_rollup(version, start_date, end_date)
+    col1, col2 = st.columns(2)
+    with col1:
+        grain = GRAINS[st.radio("Agrupamento", list(GRAINS), horizontal=True)]
+    with col2:
+        unidades = st.multiselect("Unidade", sorted(daily['Unidade'].dropna().unique()))
+    if unidades:
+        daily = daily[daily['Unidade'].isin(unidades)]
+
+    series = resample(daily.groupby('day')[['valor', 'vendas']].sum(), grain)
+    series = full_periods(series, start_date, end_date, grain)
+
+    # The same number of days just before the range
+    previous = range_rollup(version, *previous_range(start_date, end_date))
+    if unidades:
+        previous = previous[previous['Unidade'].isin(unidades)]
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Valor Total", f"R$ {series['valor'].sum():,.2f}",
+                  delta=change(series['valor'].sum(), previous['valor'].sum()), help="vs. período anterior")
+    with col2:
+        st.metric("Total de Vendas", f"{int(series['vendas'].sum()):,}",
+                  delta=change(series['vendas'].sum(), previous['vendas'].sum()), help="vs. período anterior")
+
+    st.bar_chart(series['valor'])
+    trend = with_deltas(series, ['valor', 'vendas'])
+    trend.index = trend.index.date
+    trend.columns = ['Valor líquido', 'Vendas', 'Valor Δ%', 'Vendas Δ%']
+    st.dataframe(trend, column_config={
+        'Valor líquido': st.column_config.NumberColumn(format="R$ %.2f"),
+    })
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def range_figures(version, start_date, end_date, _report):
+    # Top entries plus an "Outros" bucket keep the figures small however many
+    # consultants or units the range has
+    series = chart_series(_report)
+    return {
+        'unidade': sales_bar_figure(series['unidade'].iloc[::-1], 'Unidade'),
+        'consultor': sales_bar_figure(series['consultor'].iloc[::-1], 'Consultor'),
+        'procedimento': procedimento_pie_figure(series['procedimento']),
+    }
 
 # Page config
 st.set_page_config(
@@ -30,37 +137,56 @@ st.set_page_config(
 st.title("COC - Análise de Vendas 📊")
 
 # File uploader
-uploaded_file = st.file_uploader("Escolha o arquivo Excel", type=['xlsx'])
+uploaded_files = st.file_uploader("Escolha os arquivos Excel", type=['xlsx'], accept_multiple_files=True)
 
-if uploaded_file is not None:
-    # Read the Excel file
-    df = pd.read_excel(uploaded_file)
-    
-    # Convert 'Data venda' to datetime and extract date only
-    df['Data venda'] = pd.to_datetime(df['Data venda']).dt.date
-    
-    # Date selector
-    today = date.today()
+# Each file is parsed once per content and merged into the local sales store,
+# so earlier months stay available without uploading them again
+for uploaded_file in uploaded_files:
+    data = uploaded_file.getvalue()
+    upload_hash = file_hash(data)
+    if not has_upload(upload_hash):
+        with st.spinner(f"Processando {uploaded_file.name}..."):
+            add_upload(read_sales_workbook(data), upload_hash, uploaded_file.name)
+
+version = store_version()
+
+if version is not None:
+    manifest = read_manifest()
+    with st.expander(f"Arquivos carregados ({len(manifest)})"):
+        uploads_df = pd.DataFrame(manifest.values())[['name', 'rows', 'first_sale', 'last_sale']]
+        uploads_df.columns = ['Arquivo', 'Linhas', 'Primeira venda', 'Última venda']
+        st.dataframe(uploads_df, hide_index=True)
+
+    # Date selector, defaulting to the month of the latest stored sale
+    last_sales = [pd.Timestamp(entry['last_sale']) for entry in manifest.values() if entry['last_sale']]
+    last_sale = max(last_sales).date() if last_sales else date.today()
     col1, col2 = st.columns(2)
     with col1:
-        start_date = st.date_input("Data Inicial", value=today)
+        start_date = st.date_input("Data Inicial", value=last_sale.replace(day=1))
     with col2:
-        end_date = st.date_input("Data Final", value=today)
+        end_date = st.date_input("Data Final", value=last_sale)
     
     # Date validation
     if start_date > end_date:
         st.error("Data inicial deve ser anterior ou igual à data final")
         st.stop()
+
+    if st.radio("Modo", ["Período", "Tendência"], horizontal=True) == "Tendência":
+        st.header("Tendência 📈")
+        show_trends(version, start_date, end_date)
+        st.stop()
     
-    # Apply filters
-    df = df[df['Status'] == 'Finalizado']
-    df = df[df['Consultor'] != 'BKO VENDAS']
-    df = df[
-        (df['Data venda'] >= start_date) & 
-        (df['Data venda'] <= end_date)
-    ]
+    cube = load_cube(version, start_date, end_date)
+    report = range_report(version, start_date, end_date, cube)
+    figures = range_figures(version, start_date, end_date, report)
+    total_valor, total_vendas = report['total_valor'], report['total_vendas']
+
+    # Same dates one year earlier, from the daily rollups
+    previous_start = (pd.Timestamp(start_date) - pd.DateOffset(years=1)).date()
+    previous_end = (pd.Timestamp(end_date) - pd.DateOffset(years=1)).date()
+    previous_valor, previous_vendas = range_totals(version, previous_start, previous_end)
     
-    if len(df) == 0:
+    if total_vendas == 0:
         st.warning("Nenhum dado encontrado para o período selecionado")
         st.stop()
     
@@ -69,96 +195,49 @@ if uploaded_file is not None:
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        total_valor = df['Valor líquido'].sum()
-        st.metric("Valor Total", f"R$ {total_valor:,.2f}")
+        st.metric("Valor Total", f"R$ {total_valor:,.2f}",
+                  delta=change(total_valor, previous_valor), help="vs. mesmo período do ano anterior")
     
     with col2:
-        media_valor = df['Valor líquido'].mean()
-        st.metric("Ticket Médio", f"R$ {media_valor:,.2f}")
+        media_valor = total_valor / total_vendas
+        previous_media = previous_valor / previous_vendas if previous_vendas else 0
+        st.metric("Ticket Médio", f"R$ {media_valor:,.2f}",
+                  delta=change(media_valor, previous_media), help="vs. mesmo período do ano anterior")
     
     with col3:
-        total_vendas = len(df)
-        st.metric("Total de Vendas", f"{total_vendas:,}")
+        st.metric("Total de Vendas", f"{total_vendas:,}",
+                  delta=change(total_vendas, previous_vendas), help="vs. mesmo período do ano anterior")
 
     st.write("---")
 
     # Division 1
     st.header("Visão por Unidade 💜")
     col1, col2 = st.columns(2)
+    unidade_totals = report['unidade']
     
     with col1:
         # DataFrame grouped by Unidade
-        unidade_df = df.groupby('Unidade')['Valor líquido'].sum().sort_values(ascending=False).reset_index()
+        unidade_df = unidade_totals.reset_index()
         unidade_df['Valor líquido'] = unidade_df['Valor líquido'].apply(lambda x: f'R$ {x:,.2f}')
         st.dataframe(unidade_df, hide_index=True)
     
     with col2:
         # Bar chart for "Valor líquido por Unidade"
-        unidade_sales = df.groupby('Unidade')['Valor líquido'].sum().sort_values(ascending=True)
-        
-        # Generate enough colors for all units
-        colors = generate_color_gradient(len(unidade_sales))
-        
-        fig = go.Figure(data=[
-            go.Bar(
-                x=unidade_sales.index,
-                y=unidade_sales.values,
-                text=[f'R$ {x:,.2f}' for x in unidade_sales.values],
-                textposition='auto',
-                marker_color=colors
-            )
-        ])
-        
-        fig.update_layout(
-            xaxis_title='Unidade',
-            yaxis_title='Valor líquido (R$)',
-            showlegend=False
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(figures['unidade'], use_container_width=True)
     
     # Division 2
     st.header("Vendas por Consultor 💎")
     col1, col2 = st.columns(2)
+    consultor_totals = report['consultor']
     
     with col1:
         # Bar chart for "Análise por Consultor"
-        consultor_sales = df.groupby('Consultor')['Valor líquido'].sum().sort_values(ascending=True)
-        
-        # Generate enough colors for all consultants
-        colors = generate_color_gradient(len(consultor_sales))
-        
-        fig = go.Figure(data=[
-            go.Bar(
-                x=consultor_sales.index,
-                y=consultor_sales.values,
-                text=[f'R$ {x:,.2f}' for x in consultor_sales.values],
-                textposition='auto',
-                marker_color=colors
-            )
-        ])
-        
-        fig.update_layout(
-            xaxis_title='Consultor',
-            yaxis_title='Valor líquido (R$)',
-            showlegend=False
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(figures['consultor'], use_container_width=True)
     
     with col2:
-        # DataFrame grouped by Consultor with additional metrics
-        consultor_stats = df.groupby('Consultor').agg({
-            'Valor líquido': ['sum', 'mean'],
-            'ID orçamento': 'nunique'  # Count unique budget IDs
-        }).round(2)
-        
-        # Rename columns
-        consultor_stats.columns = ['Total Vendas', 'Média por Venda', 'Quantidade']
-        
-        # Reorder columns
-        consultor_stats = consultor_stats[['Total Vendas', 'Quantidade', 'Média por Venda']]
-        consultor_stats = consultor_stats.sort_values('Total Vendas', ascending=False)
+        # Consultor totals with unique budget IDs and average per sale
+        consultor_stats = consultor_totals[['valor', 'quantidade', 'media']].round(2)
+        consultor_stats.columns = ['Total Vendas', 'Quantidade', 'Média por Venda']
         
         # Format currency values
         consultor_stats['Total Vendas'] = consultor_stats['Total Vendas'].apply(lambda x: f'R$ {x:,.2f}')
@@ -172,36 +251,21 @@ if uploaded_file is not None:
     # Division 3
     st.header("Visão por Procedimento 💜")
     col1, col2 = st.columns(2)
+    procedimento_totals = report['procedimento']
     
     with col1:
         # DataFrame grouped by Procedimento (top 10)
-        procedimento_df = df.groupby('Procedimento')['Valor líquido'].sum().sort_values(ascending=False).head(10).reset_index()
+        procedimento_df = procedimento_totals.head(10).reset_index()
         procedimento_df['Valor líquido'] = procedimento_df['Valor líquido'].apply(lambda x: f'R$ {x:,.2f}')
         st.dataframe(procedimento_df, hide_index=True)
     
     with col2:
-        # Pie chart for top 5 procedures using Plotly
-        top_5_proc = df.groupby('Procedimento')['Valor líquido'].sum().sort_values(ascending=False).head(5)
-        
-        fig = go.Figure(data=[go.Pie(
-            labels=top_5_proc.index,
-            values=top_5_proc.values,
-            hole=.4,
-            textinfo='label+percent',
-            marker=dict(colors=COLORS)
-        )])
-        
-        fig.update_layout(
-            height=400,
-            showlegend=True,
-            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+        # Pie chart for the top 5 procedures and the rest using Plotly
+        st.plotly_chart(figures['procedimento'], use_container_width=True)
     
     
 else:
-    st.info("Por favor, faça upload do arquivo Excel para visualizar a análise.")
+    st.info("Por favor, faça upload de um ou mais arquivos Excel para visualizar a análise.")
 
 # Footer
 st.markdown("<div style='position: fixed; bottom: 10px; right: 10px; font-size: 12px;'>Pró-Corpo Lab 💜</div>", unsafe_allow_html=True)
\ No newline at end of file
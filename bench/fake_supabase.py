@@ -0,0 +1,44 @@
+"""Stand-in for the Supabase client that only records what would be written."""
+import threading
+import time
+
+
+class FakeSupabase:
+    """Accepts table(...).insert/upsert(...).execute() like PostgREST.
+
+    Each execute() sleeps `batch_latency` plus `row_latency` per row, emulating
+    a round trip, and records its duration in `batch_seconds`.
+    """
+
+    def __init__(self, batch_latency=0.05, row_latency=0.0002):
+        self.batch_latency = batch_latency
+        self.row_latency = row_latency
+        self.rows = 0
+        self.batch_seconds = []
+        self._lock = threading.Lock()
+
+    def table(self, name):
+        return _FakeQuery(self)
+
+    def _execute(self, rows):
+        started = time.perf_counter()
+        time.sleep(self.batch_latency + self.row_latency * len(rows))
+        with self._lock:
+            self.rows += len(rows)
+            self.batch_seconds.append(time.perf_counter() - started)
+
+
+class _FakeQuery:
+    def __init__(self, client):
+        self.client = client
+        self.payload = []
+
+    def insert(self, rows, **kwargs):
+        self.payload = rows
+        return self
+
+    upsert = insert
+
+    def execute(self):
+        self.client._execute(self.payload)
+        return self
@@ -0,0 +1,85 @@
+"""Local aiohttp server emulating the fetchBillCharges GraphQL query.
+
+Every query is answered with `pages` pages of deterministic synthetic charges,
+after `latency` seconds, failing with 503 at `error_rate` and with 429 (plus a
+Retry-After header) at `rate_429`.
+"""
+import asyncio
+import random
+from aiohttp import web
+
+STORES = [f'Pró-Corpo Unidade {i}' for i in range(12)]
+PAYMENT_METHODS = ['Pix', 'Cartão de Crédito', 'Boleto', 'Dinheiro']
+PROCEDURES = ['Criolipólise', 'Drenagem Linfática', 'Radiofrequência', 'Massagem Modeladora', 'Ultrassom']
+
+
+def synthetic_charge(rng, page, index, day):
+    items = [
+        {'amount': rng.randrange(5000, 200000), 'description': rng.choice(PROCEDURES), 'quantity': rng.randint(1, 10)}
+        for _ in range(rng.randint(1, 4))
+    ]
+    is_paid = rng.random() < 0.85
+    return {
+        'quote': {
+            'id': f'{page}-{index}',
+            'customer': {
+                'id': str(rng.randrange(10**6)),
+                'name': f'Cliente {rng.randrange(10**5)}',
+                'taxvat': f'{rng.randrange(10**11):011d}',
+                'email': f'cliente{rng.randrange(10**5)}@example.com',
+            },
+            'status': 'approved',
+            'bill': {
+                'total': sum(item['amount'] for item in items),
+                'installmentsQuantity': rng.randint(1, 12),
+                'items': items,
+            },
+        },
+        'store': {'name': rng.choice(STORES)},
+        'amount': rng.randrange(5000, 500000),
+        'paidAt': f'{day}T{rng.randrange(24):02d}:{rng.randrange(60):02d}:00-03:00' if is_paid else None,
+        'dueAt': f'{day}T00:00:00-03:00',
+        'isPaid': is_paid,
+        'paymentMethod': {'name': rng.choice(PAYMENT_METHODS)},
+    }
+
+
+def create_app(pages=10, per_page=200, latency=0.05, error_rate=0.0, rate_429=0.0, retry_after=1.0, seed=0):
+    failures = random.Random(seed)
+    app = web.Application()
+    app['requests'] = 0
+
+    async def graphql(request):
+        app['requests'] += 1
+        body = await request.json()
+        variables = body['variables']
+        page = variables['pagination']['currentPage']
+        day = variables['filters']['paidAtRange']['start']
+
+        await asyncio.sleep(latency)
+        roll = failures.random()
+        if roll < rate_429:
+            return web.Response(status=429, headers={'Retry-After': str(retry_after)})
+        if roll < rate_429 + error_rate:
+            return web.Response(status=503, text='Service Unavailable')
+
+        # Seeded per page so a page has the same content every time it is asked for
+        rng = random.Random(f'{seed}-{day}-{page}')
+        data = [synthetic_charge(rng, page, i, day) for i in range(per_page)] if page <= pages else []
+        return web.json_response({'data': {'fetchBillCharges': {
+            'data': data,
+            'meta': {'currentPage': page, 'lastPage': pages},
+        }}})
+
+    app.router.add_post('/graphql', graphql)
+    return app
+
+
+async def start_server(port=0, **options):
+    """Start the mock server; returns (runner, url). Call `await runner.cleanup()` to stop it."""
+    runner = web.AppRunner(create_app(**options), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', port)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f'http://{host}:{port}/graphql'
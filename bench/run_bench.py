@@ -0,0 +1,230 @@
+"""Benchmark the sync and Excel pipelines against local stand-ins.
+
+    python -m bench.run_bench --stages fetch transform insert excel --pages 30
+
+Each stage runs in a fresh process so peak RSS is per stage, and all inputs
+are seeded so numbers are comparable between runs. Nothing touches the live
+API or Supabase.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+STAGES = ['fetch', 'transform', 'insert', 'excel']
+
+
+def _peak_rss_mb():
+    # ru_maxrss survives fork+exec on Linux, so prefer the per-address-space high-water mark
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _summary(name, items, seconds, latencies, baseline_rss, **extra):
+    latencies = sorted(latencies)
+    quantiles = statistics.quantiles(latencies, n=20, method='inclusive') if len(latencies) > 1 else latencies * 19
+    return {
+        'stage': name,
+        'items': items,
+        'seconds': round(seconds, 3),
+        'items_per_second': round(items / seconds, 1) if seconds else None,
+        'p50_ms': round(statistics.median(latencies) * 1000, 2) if latencies else None,
+        'p95_ms': round(quantiles[18] * 1000, 2) if latencies else None,
+        'baseline_rss_mb': round(baseline_rss, 1),
+        'peak_rss_mb': round(_peak_rss_mb(), 1),
+        **extra,
+    }
+
+
+class _NullStatus:
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def _synthetic_pages(options):
+    from bench.mock_graphql import synthetic_charge
+    pages = []
+    for page in range(1, options['pages'] + 1):
+        rng = random.Random(f"{options['seed']}-{page}")
+        pages.append([synthetic_charge(rng, page, i, '2024-01-15') for i in range(options['per_page'])])
+    return pages
+
+
+def _serve(options, ready):
+    from bench.mock_graphql import start_server
+
+    async def serve():
+        runner, url = await start_server(
+            pages=options['pages'], per_page=options['per_page'], latency=options['latency'],
+            error_rate=options['error_rate'], rate_429=options['rate_429'], seed=options['seed'],
+        )
+        ready.put(url)
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def bench_fetch(options):
+    ctx = multiprocessing.get_context('spawn')
+    ready = ctx.Queue()
+    server = ctx.Process(target=_serve, args=(options, ready), daemon=True)
+    server.start()
+    try:
+        os.environ['PROCORPO_GRAPHQL_URL'] = ready.get(timeout=30)
+        import fetch_bill_charges
+        from fetch_graphql import create_session
+
+        latencies = []
+        fetch_graphql = fetch_bill_charges.fetch_graphql
+
+        async def timed_fetch_graphql(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fetch_graphql(*args, **kwargs)
+            finally:
+                latencies.append(time.perf_counter() - started)
+
+        fetch_bill_charges.fetch_graphql = timed_fetch_graphql
+        baseline = _peak_rss_mb()
+
+        async def run():
+            charges = 0
+            async with create_session() as session:
+                async for _, _, page in fetch_bill_charges.iter_bill_charges(
+                        session, '2024-01-15', '2024-01-15', 'bench-token', _NullStatus(),
+                        max_workers=options['workers'], requests_per_second=options['rps']):
+                    charges += len(page)
+            return charges
+
+        started = time.perf_counter()
+        charges = asyncio.run(run())
+        seconds = time.perf_counter() - started
+        return _summary('fetch', options['pages'], seconds, latencies, baseline,
+                        charges=charges, charges_per_second=round(charges / seconds, 1))
+    finally:
+        server.terminate()
+
+
+def bench_transform(options):
+    from transform import transform_charges
+    pages = _synthetic_pages(options)
+    baseline = _peak_rss_mb()
+
+    latencies = []
+    started = time.perf_counter()
+    for page in pages:
+        page_started = time.perf_counter()
+        transform_charges(page)
+        latencies.append(time.perf_counter() - page_started)
+    seconds = time.perf_counter() - started
+    rows = sum(len(page) for page in pages)
+    return _summary('transform', rows, seconds, latencies, baseline, pages=len(pages))
+
+
+def bench_insert(options):
+    from bench.fake_supabase import FakeSupabase
+    from bulk_writer import BulkWriter
+    from transform import transform_charges, to_records
+    records = [record for page in _synthetic_pages(options) for record in to_records(transform_charges(page))]
+    sink = FakeSupabase(batch_latency=options['insert_latency'])
+    baseline = _peak_rss_mb()
+
+    started = time.perf_counter()
+    with BulkWriter(sink) as writer:
+        writer.write(records)
+        writer.flush()
+    seconds = time.perf_counter() - started
+    return _summary('insert', sink.rows, seconds, sink.batch_seconds, baseline,
+                    batches=len(sink.batch_seconds), final_batch_size=writer.batch_size)
+
+
+def bench_excel(options):
+    from excel_ingest import read_sales_workbook
+    from sales_analytics import SalesCube, prepare_sales
+    with open(options['xlsx'], 'rb') as f:
+        data = f.read()
+    baseline = _peak_rss_mb()
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(options['repeat']):
+        run_started = time.perf_counter()
+        rows = len(read_sales_workbook(data))
+        latencies.append(time.perf_counter() - run_started)
+    seconds = time.perf_counter() - started
+
+    cube_started = time.perf_counter()
+    SalesCube(prepare_sales(read_sales_workbook(data)))
+    return _summary('excel', options['rows'] * options['repeat'], seconds, latencies, baseline,
+                    kept_rows=rows, cube_seconds=round(time.perf_counter() - cube_started, 3))
+
+
+BENCHES = {'fetch': bench_fetch, 'transform': bench_transform, 'insert': bench_insert, 'excel': bench_excel}
+
+
+def _run_stage(stage, options, results):
+    results.put(BENCHES[stage](options))
+
+
+def run_stage(stage, options):
+    """Run one stage in a fresh interpreter and return its summary."""
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    process = ctx.Process(target=_run_stage, args=(stage, options, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark fetch/transform/insert/Excel stages locally.")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--pages', type=int, default=30, help="pages served by the mock API")
+    parser.add_argument('--per-page', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.05, help="mock API latency per request (s)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument('--rate-429', type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument('--workers', type=int, default=4, help="concurrent page workers")
+    parser.add_argument('--rps', type=float, default=20.0, help="client rate limit (requests/s)")
+    parser.add_argument('--insert-latency', type=float, default=0.05, help="fake Supabase latency per batch (s)")
+    parser.add_argument('--rows', type=int, default=50_000, help="rows in the synthetic workbook")
+    parser.add_argument('--repeat', type=int, default=3, help="Excel parses to time")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', metavar='PATH', help="also write the results to PATH")
+    args = parser.parse_args(argv)
+    options = vars(args)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if 'excel' in args.stages:
+            from bench.synthetic_xlsx import write_synthetic_xlsx
+            options['xlsx'] = write_synthetic_xlsx(os.path.join(tmp, 'sales.xlsx'), args.rows, args.seed)
+
+        results = []
+        for stage in args.stages:
+            result = run_stage(stage, options)
+            results.append(result)
+            print(json.dumps(result, ensure_ascii=False))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
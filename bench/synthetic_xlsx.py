@@ -0,0 +1,27 @@
+"""Synthetic sales export shaped like the workbooks app_excel.py reads."""
+import numpy as np
+import pandas as pd
+
+# Columns the exports carry besides the ones the dashboard uses
+PADDING_COLUMNS = [f'Campo {i}' for i in range(20)]
+
+
+def synthetic_sales(rows, seed=0, start='2024-01-01', days=365):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'ID orçamento': rng.integers(1, rows // 2 + 2, rows),
+        'Data venda': pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days * 24 * 60, rows), unit='m'),
+        'Status': rng.choice(['Finalizado', 'Cancelado', 'Pendente'], rows, p=[0.8, 0.1, 0.1]),
+        'Consultor': rng.choice([f'Consultor {i}' for i in range(300)] + ['BKO VENDAS'], rows),
+        'Unidade': rng.choice([f'Unidade {i}' for i in range(40)], rows),
+        'Procedimento': rng.choice([f'Procedimento {i}' for i in range(150)], rows),
+        'Valor líquido': rng.gamma(2.0, 400.0, rows).round(2),
+    })
+    for column in PADDING_COLUMNS:
+        df[column] = rng.integers(0, 10**6, rows).astype(str)
+    return df
+
+
+def write_synthetic_xlsx(path, rows, seed=0):
+    synthetic_sales(rows, seed).to_excel(path, index=False)
+    return path
@@ -0,0 +1,87 @@
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+# paidAtRange dates are local days in this zone; syncs, reports and the
+# browser all bound a date range by its local midnights
+API_TIMEZONE = 'America/Sao_Paulo'
+
+# Columns offered by the results browser, and the ones shown by default
+BROWSE_COLUMNS = [
+    'paid_at', 'store_name', 'customer_name', 'total_amount', 'is_paid', 'payment_method',
+    'installments', 'status', 'due_at', 'quote_id', 'customer_id', 'customer_taxvat',
+    'customer_email', 'quote_items',
+]
+DEFAULT_BROWSE_COLUMNS = ['paid_at', 'store_name', 'customer_name', 'total_amount', 'is_paid', 'payment_method']
+BROWSE_PAGE_SIZE = 100
+
+
+def _local_midnight(day):
+    return datetime.combine(day, time(), tzinfo=ZoneInfo(API_TIMEZONE)).isoformat()
+
+
+def _in_range(query, start_date, end_date, filters=None):
+    """Restrict a bill_charges query to the paid range and the browser filters.
+
+    `filters` may hold 'store_names' (list), 'is_paid' (bool) and 'customer'
+    (case-insensitive substring of the customer name).
+    """
+    query = query.gte('paid_at', _local_midnight(start_date)).lt('paid_at', _local_midnight(end_date + timedelta(days=1)))
+    filters = filters or {}
+    if filters.get('store_names'):
+        query = query.in_('store_name', list(filters['store_names']))
+    if filters.get('is_paid') is not None:
+        query = query.eq('is_paid', filters['is_paid'])
+    if filters.get('customer'):
+        query = query.ilike('customer_name', f"%{filters['customer']}%")
+    return query
+
+
+def browse_bill_charges(supabase, start_date, end_date, columns, filters=None, after_id=None,
+                        page_size=BROWSE_PAGE_SIZE):
+    """Return one page of rows in id order, starting after `after_id` (keyset pagination).
+
+    Only `columns` (plus id, the cursor) are selected and the filters run in
+    Postgres, so the cost of a page does not grow with the page number.
+    """
+    query = supabase.table('bill_charges').select(','.join(['id', *columns]))
+    query = _in_range(query, start_date, end_date, filters)
+    if after_id is not None:
+        query = query.gt('id', after_id)
+    return query.order('id').limit(page_size).execute().data
+
+
+def count_bill_charges(supabase, start_date, end_date, filters=None):
+    """Number of rows matching the browser filters, without fetching them."""
+    query = supabase.table('bill_charges').select('id', count='exact', head=True)
+    return _in_range(query, start_date, end_date, filters).execute().count
+
+
+def get_watermark(supabase, start_date, end_date):
+    response = (
+        supabase.table('sync_state')
+        .select('watermark')
+        .eq('range_start', start_date.isoformat())
+        .eq('range_end', end_date.isoformat())
+        .execute()
+    )
+    if not response.data:
+        return None
+    return response.data[0]['watermark']
+
+
+def save_watermark(supabase, start_date, end_date, watermark):
+    supabase.table('sync_state').upsert({
+        'range_start': start_date.isoformat(),
+        'range_end': end_date.isoformat(),
+        'watermark': watermark,
+        'synced_at': datetime.now(timezone.utc).isoformat(),
+    }).execute()
+
+
+def refresh_daily_rollup(supabase, start_date, end_date):
+    """Recompute bill_charges_daily for the days between the two dates (inclusive)."""
+    supabase.rpc('refresh_bill_charges_daily', {
+        'range_start': start_date.isoformat(),
+        'range_end': end_date.isoformat(),
+        'api_timezone': API_TIMEZONE,
+    }).execute()
@@ -0,0 +1,154 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+import httpx
+import orjson
+from postgrest.exceptions import APIError
+from metrics import METRICS
+
+BATCH_SIZE = 100
+MIN_BATCH_SIZE = 25
+MAX_BATCH_SIZE = 1000
+MAX_WORKERS = 4
+# A batch slower than this shrinks the next ones, a faster one grows them
+TARGET_LATENCY = 1.0
+MAX_PAYLOAD_BYTES = 1_000_000
+MAX_ATTEMPTS = 3
+
+
+class BulkWriteError(Exception):
+    def __init__(self, batches, errors):
+        super().__init__(f"{len(batches)} batch(es) failed to write: {errors[-1]!r}")
+        self.batches = batches
+        self.errors = errors
+
+
+class BulkWriter:
+    """Upsert rows into a Supabase table from a bounded thread pool.
+
+    The batch size adapts to observed latency (AIMD) and is capped so a batch
+    stays under MAX_PAYLOAD_BYTES. Each batch is retried on its own; batches
+    still failing, or failing with an unexpected error, are raised together
+    from flush() as a BulkWriteError and can be resubmitted with retry_failed().
+    """
+
+    def __init__(self, supabase, table='bill_charges', on_conflict='charge_key',
+                 max_workers=MAX_WORKERS, batch_size=BATCH_SIZE):
+        self.supabase = supabase
+        self.table = table
+        self.on_conflict = on_conflict
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self.batches_written = 0
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='bulk-writer')
+        # Bounds queued batches so write() applies backpressure to the producer
+        self._slots = threading.BoundedSemaphore(max_workers * 2)
+        self._lock = threading.Lock()
+        self._futures = []
+        self._failed = []
+        self._errors = []
+        self._started_at = None
+        self._finished_at = None
+
+    @property
+    def rows_per_second(self):
+        if self._started_at is None or self._finished_at is None:
+            return 0.0
+        return self.rows_written / max(self._finished_at - self._started_at, 1e-9)
+
+    def write(self, records):
+        """Queue records for upsert; blocks while the pool is saturated."""
+        if self._started_at is None:
+            self._started_at = time.monotonic()
+        if self.on_conflict:
+            # Postgres rejects an upsert that touches the same key twice in one statement
+            key_columns = self.on_conflict.split(',')
+            records = list({tuple(record[column] for column in key_columns): record for record in records}.values())
+
+        i = 0
+        while i < len(records):
+            batch = records[i:i + self.batch_size]
+            i += len(batch)
+            self._submit(batch)
+
+    def retry_failed(self):
+        with self._lock:
+            batches, self._failed, self._errors = self._failed, [], []
+        for batch in batches:
+            self._submit(batch)
+
+    def flush(self):
+        """Wait for every queued batch; raise BulkWriteError if any batch gave up."""
+        with self._lock:
+            futures, self._futures = self._futures, []
+        wait([future for future, _ in futures])
+        # A batch that raised something other than a retryable error is failed too
+        for future, batch in futures:
+            error = future.exception()
+            if error is not None:
+                METRICS.inc('insert_failed_batches', table=self.table)
+                with self._lock:
+                    self._failed.append(batch)
+                    self._errors.append(error)
+        METRICS.set('insert_rows_per_second', round(self.rows_per_second, 1), table=self.table)
+        METRICS.set('insert_batch_size', self.batch_size, table=self.table)
+        if self._failed:
+            raise BulkWriteError(list(self._failed), list(self._errors))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _submit(self, batch):
+        self._slots.acquire()
+        future = self._executor.submit(self._write_batch, batch)
+        future.add_done_callback(lambda _: self._slots.release())
+        with self._lock:
+            self._futures.append((future, batch))
+
+    def _write_batch(self, batch):
+        payload_bytes = len(orjson.dumps(batch))
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            started = time.monotonic()
+            try:
+                query = self.supabase.table(self.table)
+                if self.on_conflict:
+                    query.upsert(batch, on_conflict=self.on_conflict).execute()
+                else:
+                    query.insert(batch).execute()
+            except (APIError, httpx.HTTPError) as e:
+                if attempt == MAX_ATTEMPTS:
+                    METRICS.inc('insert_failed_batches', table=self.table)
+                    with self._lock:
+                        self._failed.append(batch)
+                        self._errors.append(e)
+                    return
+                METRICS.inc('insert_retries', table=self.table)
+                time.sleep(2 ** attempt)
+                continue
+
+            seconds = time.monotonic() - started
+            METRICS.observe('insert_batch_seconds', seconds, table=self.table)
+            METRICS.inc('insert_payload_bytes', payload_bytes, table=self.table)
+            METRICS.inc('rows_written', len(batch), table=self.table)
+            self._adapt(len(batch), payload_bytes, seconds)
+            with self._lock:
+                self.rows_written += len(batch)
+                self.batches_written += 1
+                self._finished_at = time.monotonic()
+            return
+
+    def _adapt(self, rows, payload_bytes, seconds):
+        with self._lock:
+            if seconds > TARGET_LATENCY:
+                size = self.batch_size // 2
+            else:
+                size = self.batch_size + MIN_BATCH_SIZE
+            bytes_per_row = max(payload_bytes // max(rows, 1), 1)
+            size = min(size, MAX_PAYLOAD_BYTES // bytes_per_row)
+            self.batch_size = max(MIN_BATCH_SIZE, min(MAX_BATCH_SIZE, size))
@@ -0,0 +1,96 @@
+import os
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import date, timedelta
+import orjson
+
+CACHE_PATH = os.path.join(os.path.dirname(__file__), '.cache', 'bill_charges.sqlite')
+# Closed days are refetched after this many seconds
+CACHE_TTL = 30 * 24 * 3600
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Today and the day before can still receive payments, so they are never cached
+MUTABLE_DAYS = 2
+
+
+def is_mutable_day(day, mutable_days=MUTABLE_DAYS):
+    """Whether payments can still land on `day`, so data fetched for it may be stale."""
+    return day > date.today() - timedelta(days=mutable_days)
+
+
+class ChargesCache:
+    """On-disk cache of raw bill charges, one compressed SQLite row per paid day.
+
+    Only closed days are stored. Entries expire after `ttl` seconds and the
+    least recently used days are evicted once the cache exceeds `max_bytes`.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES, mutable_days=MUTABLE_DAYS):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.mutable_days = mutable_days
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS day_shards (
+                day TEXT PRIMARY KEY,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL,
+                payload BLOB NOT NULL
+            )''')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def is_mutable(self, day):
+        return is_mutable_day(day, self.mutable_days)
+
+    def get(self, day):
+        """Return the cached charges for `day`, or None on a miss."""
+        if self.is_mutable(day):
+            return None
+        with self._connect() as conn:
+            row = conn.execute('SELECT fetched_at, payload FROM day_shards WHERE day = ?',
+                               (day.isoformat(),)).fetchone()
+            if row is None:
+                return None
+            fetched_at, payload = row
+            if time.time() - fetched_at > self.ttl:
+                conn.execute('DELETE FROM day_shards WHERE day = ?', (day.isoformat(),))
+                return None
+            conn.execute('UPDATE day_shards SET accessed_at = ? WHERE day = ?', (time.time(), day.isoformat()))
+        return orjson.loads(zlib.decompress(payload))
+
+    def put(self, day, charges):
+        if self.is_mutable(day):
+            return
+        payload = zlib.compress(orjson.dumps(charges))
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO day_shards VALUES (?, ?, ?, ?, ?)',
+                         (day.isoformat(), now, now, len(payload), payload))
+        self.evict()
+
+    def evict(self):
+        """Drop the least recently used days until the cache fits in max_bytes."""
+        with self._connect() as conn:
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM day_shards').fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for day, size in conn.execute('SELECT day, size FROM day_shards ORDER BY accessed_at').fetchall():
+                conn.execute('DELETE FROM day_shards WHERE day = ?', (day,))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM day_shards')
@@ -0,0 +1,27 @@
+import pandas as pd
+
+OTHERS = 'Outros'
+# Bars per chart and pie slices before the rest is folded into OTHERS
+TOP_BARS = 20
+TOP_SLICES = 5
+# Light to dark purple; bars take positions along it instead of one color string each
+PURPLE_SCALE = [[0.0, 'rgb(232,232,250)'], [1.0, 'rgb(128,0,128)']]
+
+
+def top_n(values, n, others=OTHERS):
+    """The `n` largest entries of a Series, largest first, plus one entry summing the rest."""
+    values = values.sort_values(ascending=False)
+    if len(values) <= n:
+        return values
+    head = values.iloc[:n]
+    rest = pd.Series([values.iloc[n:].sum()], index=[others])
+    return pd.concat([pd.Series(head.to_numpy(), index=head.index.astype(str)), rest]).rename(values.name)
+
+
+def chart_series(report):
+    """Series behind each chart of a range report, computed from its groupings."""
+    return {
+        'unidade': top_n(report['unidade'], TOP_BARS),
+        'consultor': top_n(report['consultor']['valor'], TOP_BARS),
+        'procedimento': top_n(report['procedimento'], TOP_SLICES),
+    }
@@ -0,0 +1,69 @@
+from io import BytesIO
+import openpyxl
+import pandas as pd
+
+try:
+    import python_calamine  # noqa: F401  (enables pandas' calamine engine)
+    HAS_CALAMINE = True
+except ImportError:
+    HAS_CALAMINE = False
+
+# The only columns the dashboard uses, out of the dozens in the export
+SALES_COLUMNS = ['Data venda', 'Status', 'Consultor', 'Unidade', 'Procedimento', 'Valor líquido', 'ID orçamento']
+CATEGORY_COLUMNS = ['Status', 'Consultor', 'Unidade', 'Procedimento']
+TEXT_DTYPES = {column: str for column in CATEGORY_COLUMNS}
+
+
+def keep_row(status, consultor):
+    return status == 'Finalizado' and consultor != 'BKO VENDAS'
+
+
+def _read_calamine(data):
+    df = pd.read_excel(BytesIO(data), engine='calamine', usecols=SALES_COLUMNS, dtype=TEXT_DTYPES)
+    # Same rule as keep_row, vectorized
+    return df[(df['Status'] == 'Finalizado') & (df['Consultor'] != 'BKO VENDAS')]
+
+
+def _read_openpyxl(data):
+    # Read-only mode streams rows instead of building the whole workbook in memory
+    workbook = openpyxl.load_workbook(BytesIO(data), read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        missing = [column for column in SALES_COLUMNS if column not in header]
+        if missing:
+            raise ValueError(f"Colunas ausentes na planilha: {', '.join(missing)}")
+
+        positions = [header.index(column) for column in SALES_COLUMNS]
+        status_at, consultor_at = header.index('Status'), header.index('Consultor')
+        kept = [
+            [row[i] for i in positions]
+            for row in rows
+            if keep_row(row[status_at], row[consultor_at])
+        ]
+    finally:
+        workbook.close()
+    return pd.DataFrame(kept, columns=SALES_COLUMNS)
+
+
+def _typed(df):
+    df = df.reset_index(drop=True)
+    for column in CATEGORY_COLUMNS:
+        df[column] = df[column].astype('category')
+    df['Data venda'] = pd.to_datetime(df['Data venda'])
+    df['Valor líquido'] = pd.to_numeric(df['Valor líquido'], errors='coerce').astype('float64')
+
+    # Quote IDs are usually numeric; fall back to text so Parquet gets one type
+    ids = pd.to_numeric(df['ID orçamento'], errors='coerce')
+    if ids.notna().sum() == df['ID orçamento'].notna().sum():
+        df['ID orçamento'] = ids.astype('Int64')
+    else:
+        df['ID orçamento'] = df['ID orçamento'].astype('string')
+    return df
+
+
+def read_sales_workbook(data):
+    """Read the finalized, non-BKO sales of an export with only the columns we use."""
+    df = _read_calamine(data) if HAS_CALAMINE else _read_openpyxl(data)
+    return _typed(df)
+
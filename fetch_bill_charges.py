@@ -1,94 +1,218 @@
 import asyncio
-from fetch_graphql import fetch_graphql
-import streamlit as st
-
-async def fetch_bill_charges(session, start_date, end_date, token):
-    current_page = 1
-    all_bill_charges = []
-
-    # Create a placeholder for status updates
-    status_placeholder = st.empty()
-
-    while True:
-        query = '''query ($filters: BillChargeFiltersInput, $pagination: PaginationInput) {
-                fetchBillCharges(filters: $filters, pagination: $pagination) {
-                    data {
-                        quote {
-                            id
-                            customer {
-                                id
-                                name
-                                taxvat
-                                email
-                            }
-                            status
-                            bill {
-                                total
-                                installmentsQuantity
-                                items {
-                                    amount
-                                    description
-                                    quantity
-                                }
-                            }
-                        }
-                        store {
-                            name
-                        }
-                        amount
-                        paidAt
-                        dueAt
-                        isPaid
-                        paymentMethod {
-                            name
-                        }
+import os
+from fetch_graphql import fetch_graphql, GraphQLRequestError
+from rate_limiter import TokenBucket
+from range_planner import plan_shards
+from transform import raw_charge_key
+
+# Overridable so the benchmarks (or a staging API) can stand in for production
+GRAPHQL_URL = os.environ.get('PROCORPO_GRAPHQL_URL', 'https://open-api.eprocorpo.com.br/graphql')
+PER_PAGE = 200
+
+# Concurrent mode defaults; MAX_WORKERS = 1 gives the old page-by-page behaviour
+MAX_WORKERS = 4
+REQUESTS_PER_SECOND = 4.0
+
+# Sharded mode: shards fetched at once, and page workers within each shard
+SHARD_DAYS = 1
+MAX_SHARDS = 4
+SHARD_WORKERS = 2
+SHARD_ATTEMPTS = 3
+
+BILL_CHARGES_QUERY = '''query ($filters: BillChargeFiltersInput, $pagination: PaginationInput) {
+        fetchBillCharges(filters: $filters, pagination: $pagination) {
+            data {
+                quote {
+                    id
+                    customer {
+                        id
+                        name
+                        taxvat
+                        email
                     }
-                    meta {
-                        currentPage
-                        lastPage
+                    status
+                    bill {
+                        total
+                        installmentsQuantity
+                        items {
+                            amount
+                            description
+                            quantity
+                        }
                     }
                 }
-            }'''
-        variables = {
-            'filters': {
-                'paidAtRange': {
-                    'start': start_date,
-                    'end': end_date
+                store {
+                    name
                 }
-            },
-            'pagination': {
-                'currentPage': current_page,
-                'perPage': 200
+                amount
+                paidAt
+                dueAt
+                isPaid
+                paymentMethod {
+                    name
+                }
+            }
+            meta {
+                currentPage
+                lastPage
+            }
+        }
+    }'''
+
+
+class BillChargesError(Exception):
+    pass
+
+
+async def fetch_page(session, start_date, end_date, token, page):
+    variables = {
+        'filters': {
+            'paidAtRange': {
+                'start': start_date,
+                'end': end_date
             }
+        },
+        'pagination': {
+            'currentPage': page,
+            'perPage': PER_PAGE
         }
+    }
+    return await fetch_graphql(session, GRAPHQL_URL, BILL_CHARGES_QUERY, variables, token)
+
+
+def parse_page(data):
+    if 'errors' in data:
+        raise BillChargesError(f"❌ Erro GraphQL: {data['errors']}")
+
+    if 'data' not in data or 'fetchBillCharges' not in data['data']:
+        raise BillChargesError("❌ Estrutura de resposta inesperada")
+
+    result = data['data']['fetchBillCharges']
+    return result['data'], result['meta']
+
+
+async def _as_completed(items, fetch, max_workers):
+    """Run fetch(item) for each (key, item) on up to `max_workers` tasks.
+
+    Yields (key, result) in completion order. At most `max_workers` results
+    wait for the consumer; the first exception raised by a fetch is re-raised.
+    """
+    pending = asyncio.Queue()
+    for key, item in items:
+        pending.put_nowait((key, item))
+    results = asyncio.Queue(maxsize=max_workers)
 
-        data = await fetch_graphql(session, 'https://open-api.eprocorpo.com.br/graphql', query, variables, token)
+    async def worker():
+        while not pending.empty():
+            key, item = pending.get_nowait()
+            try:
+                result = await fetch(item)
+            except Exception as e:
+                # Hand every failure to the consumer, which would otherwise wait forever
+                await results.put(e)
+                return
+            await results.put((key, result))
 
-        if data is None:
-            status_placeholder.error(f"❌ Falha ao baixar página {current_page}. Tentando novamente...")
-            continue
+    total = pending.qsize()
+    workers = [asyncio.create_task(worker()) for _ in range(min(max_workers, total))]
+    try:
+        for _ in range(total):
+            item = await results.get()
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        for task in workers:
+            task.cancel()
 
-        if 'errors' in data:
-            status_placeholder.error(f"❌ Erro GraphQL: {data['errors']}")
-            return None
 
-        if 'data' not in data or 'fetchBillCharges' not in data['data']:
-            status_placeholder.error(f"❌ Estrutura de resposta inesperada")
-            return None
+async def iter_bill_charges(session, start_date, end_date, token, status_placeholder,
+                            max_workers=MAX_WORKERS, requests_per_second=REQUESTS_PER_SECOND, limiter=None):
+    """Yield (page, last_page, charges) as pages arrive, in completion order.
 
-        bill_charges_data = data['data']['fetchBillCharges']['data']
-        all_bill_charges.extend(bill_charges_data)
+    At most `max_workers` downloaded pages wait for the consumer, so memory stays
+    around a page per worker however long the range is. Pass `limiter` to share
+    one TokenBucket between several calls. Raises BillChargesError.
+    """
+    if limiter is None:
+        limiter = TokenBucket(requests_per_second)
 
-        meta = data['data']['fetchBillCharges']['meta']
-        status_message = f"📥 Baixando relatório de Vendas - Página: {current_page} de {meta['lastPage']} - De: {start_date} - Até: {end_date}"
+    async def download(page):
+        await limiter.acquire()
+        try:
+            data = await fetch_page(session, start_date, end_date, token, page)
+        except GraphQLRequestError as e:
+            raise BillChargesError(f"❌ Falha ao baixar página {page}: {e}") from e
+        return parse_page(data)
+
+    def report_progress(downloaded, last_page):
+        status_message = f"📥 Baixando relatório de Vendas - Página: {downloaded} de {last_page} - De: {start_date} - Até: {end_date}"
         status_placeholder.info(status_message)
 
-        if current_page >= meta['lastPage']:
-            break
+    # The first page tells us how many pages there are
+    first_page, meta = await download(1)
+    last_page = meta['lastPage']
+    report_progress(1, last_page)
+    yield 1, last_page, first_page
+    del first_page
+
+    remaining = ((page, page) for page in range(2, last_page + 1))
+    downloaded = 1
+    async for page, (charges, _) in _as_completed(remaining, download, max_workers):
+        downloaded += 1
+        report_progress(downloaded, last_page)
+        yield page, last_page, charges
+
+
+async def iter_bill_charges_sharded(session, start_date, end_date, token, status_placeholder,
+                                    shard_days=SHARD_DAYS, max_shards=MAX_SHARDS, cache=None,
+                                    requests_per_second=REQUESTS_PER_SECOND, skip=()):
+    """Yield (shard_number, total_shards, charges) as date shards complete.
+
+    The range is split by plan_shards and up to `max_shards` shards paginate
+    concurrently under one shared rate limit. A failed shard is retried on its
+    own, and charges already yielded by another shard are dropped. Single-day
+    shards are read from and stored in `cache` (a ChargesCache) when given.
+    Shards listed in `skip` as (start, end) pairs are neither fetched nor
+    yielded; numbering still follows the full plan.
+    """
+    shards = plan_shards(start_date, end_date, shard_days)
+    limiter = TokenBucket(requests_per_second)
+
+    async def fetch_shard(shard):
+        shard_start, shard_end = shard
+        cacheable = cache is not None and shard_start == shard_end
+        if cacheable:
+            charges = cache.get(shard_start)
+            if charges is not None:
+                return charges
+
+        for attempt in range(1, SHARD_ATTEMPTS + 1):
+            try:
+                charges = []
+                async for _, _, page_charges in iter_bill_charges(session, shard_start.isoformat(), shard_end.isoformat(),
+                                                                  token, status_placeholder, SHARD_WORKERS, limiter=limiter):
+                    charges.extend(page_charges)
+                break
+            except BillChargesError:
+                if attempt == SHARD_ATTEMPTS:
+                    raise
+                status_placeholder.warning(f"⚠️ Falha no período {shard_start} - {shard_end}. Tentando novamente...")
 
-        current_page += 1
-        await asyncio.sleep(1)
+        if cacheable:
+            cache.put(shard_start, charges)
+        return charges
 
-    final_message = f"✅ Download concluído! Total de {len(all_bill_charges)} registros baixados."
-    status_placeholder.success(final_message)
-    return all_bill_charges
+    seen = set()
+    pending = [(number, shard) for number, shard in enumerate(shards, 1) if shard not in skip]
+    done = len(shards) - len(pending)
+    async for number, charges in _as_completed(pending, fetch_shard, max_shards):
+        unique = []
+        for charge in charges:
+            key = raw_charge_key(charge)
+            if key not in seen:
+                seen.add(key)
+                unique.append(charge)
+        done += 1
+        status_placeholder.info(f"📥 Baixando relatório de Vendas - Período: {done} de {len(shards)} - De: {start_date} - Até: {end_date}")
+        yield number, len(shards), unique
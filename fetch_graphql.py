@@ -1,47 +1,125 @@
 import json
-import aiohttp
+import logging
+import random
+import time
 import asyncio
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import aiohttp
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+# Longest Retry-After we are willing to honour
+RETRY_AFTER_MAX = 120.0
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=60, sock_connect=10)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+try:
+    import brotli  # noqa: F401  (lets aiohttp decode br responses)
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+
+class GraphQLRequestError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def create_session(limit=20):
+    """ClientSession with keep-alive, DNS caching and compressed responses."""
+    connector = aiohttp.TCPConnector(limit=limit, ttl_dns_cache=300, keepalive_timeout=60)
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=REQUEST_TIMEOUT,
+        headers={'Accept-Encoding': ACCEPT_ENCODING},
+    )
+
+
+def _retry_after(response):
+    value = response.headers.get('Retry-After')
+    if value is None:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), RETRY_AFTER_MAX)
+
+
+def _backoff(attempt):
+    # Full jitter keeps concurrent workers from retrying in lockstep
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
 
 async def fetch_graphql(session, url, query, variables, token):
+    """POST a GraphQL query and return the decoded JSON body.
+
+    Retries 429/5xx responses, timeouts, dropped connections and truncated
+    bodies with jittered exponential backoff (honouring Retry-After), up to
+    MAX_ATTEMPTS in total.
+    Raises GraphQLRequestError when the request cannot succeed. GraphQL-level
+    `errors` are returned to the caller untouched.
+    """
     headers = {
         'Content-Type': 'application/json',
         'Authorization': f'Bearer {token}',
     }
-    payload = {
+    payload = json.dumps({
         'query': query,
         'variables': variables,
-    }
-
-    print(f"Making GraphQL request to {url}")
-    print(f"Headers: {headers}")
-    print(f"Variables: {variables}")
+    })
 
-    attempt = 0
-    while True:  # Infinite retry loop
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        wait_time = None
+        started = time.perf_counter()
         try:
-            async with session.post(url, headers=headers, data=json.dumps(payload)) as response:
-                print(f"Response status: {response.status}")
+            async with session.post(url, headers=headers, data=payload, timeout=REQUEST_TIMEOUT) as response:
+                body = await response.read()
+                METRICS.observe('graphql_request_seconds', time.perf_counter() - started, status=response.status)
+                METRICS.inc('graphql_response_bytes', len(body))
+
                 if response.status == 200:
-                    data = await response.json()
-                    if 'errors' in data:
-                        print(f"GraphQL errors: {data['errors']}")
-                        return None
-                    return data
-                else:
-                    response_text = await response.text()
-                    print(f"Request failed with status {response.status}")
-                    print(f"Response body: {response_text}")
-                    return None
-        except aiohttp.ClientError as e:
-            print(f"Request exception: {e}")
-            return None
+                    try:
+                        with METRICS.timer('graphql_json_decode_seconds'):
+                            return json.loads(body)
+                    except ValueError:
+                        raise GraphQLRequestError("Response is not JSON", response.status)
 
-        # Exponential backoff and retry
-        attempt += 1
-        if attempt >= 3:  # Max 3 attempts
-            print("Max retry attempts reached")
-            return None
-            
-        wait_time = min(5 * 2 ** attempt, 30)  # Exponential backoff with max wait time of 30 seconds
-        print(f"Retrying in {wait_time} seconds (attempt {attempt})...")
-        await asyncio.sleep(wait_time)
\ No newline at end of file
+                if response.status not in RETRY_STATUSES:
+                    METRICS.inc('graphql_failures', reason=response.status)
+                    raise GraphQLRequestError(f"Request failed with status {response.status}: {body[:200].decode(errors='replace')}",
+                                              response.status)
+
+                error = GraphQLRequestError(f"Request failed with status {response.status}", response.status)
+                reason = response.status
+                wait_time = _retry_after(response)
+        except asyncio.TimeoutError:
+            error = GraphQLRequestError("Request timed out")
+            reason = 'timeout'
+        except aiohttp.ClientConnectionError as e:
+            error = GraphQLRequestError(f"Connection error: {e}")
+            reason = 'connection'
+        except aiohttp.ClientPayloadError as e:
+            # Connection dropped mid-body (truncated or bad chunked/compressed stream)
+            error = GraphQLRequestError(f"Incomplete response body: {e}")
+            reason = 'payload'
+
+        if attempt == MAX_ATTEMPTS:
+            METRICS.inc('graphql_failures', reason=reason)
+            raise GraphQLRequestError(f"{error} (gave up after {MAX_ATTEMPTS} attempts)", error.status)
+
+        METRICS.inc('graphql_retries', reason=reason)
+
+        if wait_time is None:
+            wait_time = _backoff(attempt)
+        logger.warning("%s; retrying in %.1fs (attempt %d of %d)", error, wait_time, attempt, MAX_ATTEMPTS)
+        await asyncio.sleep(wait_time)
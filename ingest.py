@@ -0,0 +1,55 @@
+import asyncio
+import time
+from bulk_writer import BulkWriter
+from metrics import METRICS
+from transform import transform_charges, to_records
+
+
+async def ingest_bill_charges(supabase, pages, on_page=None, writer=None, extra_fields=None, on_written=None):
+    """Transform and upsert each page from `pages` while the next one downloads.
+
+    `pages` is an async iterator such as `iter_bill_charges`. Records go to a
+    BulkWriter (one is created when `writer` is None) from a helper thread, so
+    the event loop keeps downloading while the pool is busy.
+    `on_page(page, last_page, columns)` is called once per page with the
+    transform_charges output, after the page is queued for insert.
+    `extra_fields` is merged into every record. With `on_written(page,
+    last_page, records)` the writer is flushed after each page, and the
+    callback runs once every row of that page is confirmed written.
+    Returns the number of records ingested.
+    """
+    total_records = 0
+    owns_writer = writer is None
+    if owns_writer:
+        writer = BulkWriter(supabase)
+
+    try:
+        async for page, last_page, charges in pages:
+            started = time.perf_counter()
+            columns = transform_charges(charges)
+            records = to_records(columns)
+            transform_seconds = time.perf_counter() - started
+            METRICS.observe('transform_seconds', transform_seconds)
+            METRICS.inc('rows_transformed', len(records))
+            METRICS.event('page_transformed', page=page, last_page=last_page, rows=len(records),
+                          transform_ms=round(transform_seconds * 1000, 2))
+
+            if extra_fields:
+                for record in records:
+                    record.update(extra_fields)
+
+            await asyncio.to_thread(writer.write, records)
+            total_records += len(records)
+            if on_page is not None:
+                on_page(page, last_page, columns)
+            if on_written is not None:
+                # Downloads carry on in the background while this page drains
+                await asyncio.to_thread(writer.flush)
+                on_written(page, last_page, records)
+    finally:
+        # Let the batches in flight finish rather than abandon them mid-insert
+        await asyncio.to_thread(writer.flush)
+        if owns_writer:
+            writer.close()
+
+    return total_records
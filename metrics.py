@@ -0,0 +1,137 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager
+
+logger = logging.getLogger('metrics')
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRICS_PATH = os.path.join(os.path.dirname(__file__), '.cache', 'metrics.prom')
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+
+
+class Metrics:
+    """Thread-safe counters, gauges and latency histograms for the sync pipeline.
+
+    Exported as Prometheus text (to_prometheus / write_file) or a dict
+    (snapshot); `event` additionally writes one structured JSON log line.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _labels(labels))] = value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            histogram['buckets'][bisect_left(self.buckets, seconds)] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def event(self, event, **fields):
+        logger.info(json.dumps({'event': event, 'ts': time.time(), **fields}, ensure_ascii=False, default=str))
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': {f'{name}{_format_labels(labels)}': value for (name, labels), value in self._counters.items()},
+                'gauges': {f'{name}{_format_labels(labels)}': value for (name, labels), value in self._gauges.items()},
+                'histograms': {
+                    f'{name}{_format_labels(labels)}': {'count': h['count'], 'sum': round(h['sum'], 6)}
+                    for (name, labels), h in self._histograms.items()
+                },
+            }
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                lines.append(f'{name}_total{_format_labels(labels)} {value}')
+            for (name, labels), value in sorted(self._gauges.items()):
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), histogram['buckets']):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(labels, le=bound)} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {histogram["sum"]:.6f}')
+                lines.append(f'{name}_count{_format_labels(labels)} {histogram["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def write_file(self, path=METRICS_PATH):
+        """Write Prometheus text atomically, e.g. for node_exporter's textfile collector."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f'{path}.tmp', 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(f'{path}.tmp', path)
+
+
+METRICS = Metrics()
+
+
+@contextmanager
+def profile_sync(path, top=25):
+    """cProfile and tracemalloc one block, writing `path`.prof and logging the top entries."""
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        profiler.dump_stats(f'{path}.prof')
+        stats = pstats.Stats(profiler).sort_stats('cumulative')
+        stats.print_stats(top)
+        logger.info("peak traced memory: %.1f MiB; top allocations:", peak / 2**20)
+        for stat in snapshot.statistics('lineno')[:top]:
+            logger.info("  %s", stat)
@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+
+def plan_shards(start_date, end_date, shard_days=1):
+    """Split the inclusive range [start_date, end_date] into consecutive sub-ranges.
+
+    Each shard is an inclusive (start, end) pair of at most `shard_days` days,
+    e.g. shard_days=1 for per-day shards and 7 for per-week shards.
+    """
+    if shard_days < 1:
+        raise ValueError("shard_days must be at least 1")
+
+    shards = []
+    shard_start = start_date
+    while shard_start <= end_date:
+        shard_end = min(shard_start + timedelta(days=shard_days - 1), end_date)
+        shards.append((shard_start, shard_end))
+        shard_start = shard_end + timedelta(days=1)
+    return shards
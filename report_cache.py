@@ -0,0 +1,59 @@
+import streamlit as st
+from supabase import create_client
+from bill_charges_store import browse_bill_charges, count_bill_charges
+from reports import sales_summary, sales_by_store, sales_series
+
+# Shared by every session; entries are keyed by (range, data version) and
+# the least recently used ones are dropped past CACHE_ENTRIES
+CACHE_ENTRIES = 64
+CACHE_TTL = 3600
+# How long sessions reuse the data version before asking Supabase again
+VERSION_TTL = 10
+
+
+@st.cache_resource
+def get_supabase():
+    return create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"])
+
+
+@st.cache_data(ttl=VERSION_TTL, show_spinner=False)
+def data_version():
+    """Time of the last finished sync; changes whenever bill_charges does."""
+    response = (
+        get_supabase().table('sync_state')
+        .select('synced_at')
+        .order('synced_at', desc=True)
+        .limit(1)
+        .execute()
+    )
+    return response.data[0]['synced_at'] if response.data else None
+
+
+def invalidate():
+    """Make the next read see a sync that just finished."""
+    data_version.clear()
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, ttl=CACHE_TTL, show_spinner=False)
+def cached_summary(start_date, end_date, version):
+    return sales_summary(get_supabase(), start_date, end_date)
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, ttl=CACHE_TTL, show_spinner=False)
+def cached_sales_by_store(start_date, end_date, version):
+    return sales_by_store(get_supabase(), start_date, end_date)
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, ttl=CACHE_TTL, show_spinner=False)
+def cached_sales_series(start_date, end_date, version, grain, store=None):
+    return sales_series(get_supabase(), start_date, end_date, grain, store)
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES * 4, ttl=CACHE_TTL, show_spinner=False)
+def cached_browse_page(start_date, end_date, version, columns, filters, after_id):
+    return browse_bill_charges(get_supabase(), start_date, end_date, list(columns), dict(filters), after_id)
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, ttl=CACHE_TTL, show_spinner=False)
+def cached_browse_count(start_date, end_date, version, filters):
+    return count_bill_charges(get_supabase(), start_date, end_date, dict(filters))
@@ -0,0 +1,37 @@
+import pandas as pd
+from bill_charges_store import API_TIMEZONE
+
+# bill_charges.total_amount is stored in cents
+CENTS = 100
+
+
+def _rpc(supabase, function, start_date, end_date):
+    params = {'range_start': start_date.isoformat(), 'range_end': end_date.isoformat(), 'api_timezone': API_TIMEZONE}
+    return supabase.rpc(function, params).execute().data
+
+
+def sales_summary(supabase, start_date, end_date):
+    """Total records, total amount (R$) and paid records between the two dates."""
+    row = _rpc(supabase, 'bill_charges_summary', start_date, end_date)[0]
+    return {
+        'total_records': row['total_records'],
+        'total_amount': float(row['total_amount']) / CENTS,
+        'paid_count': row['paid_count'],
+    }
+
+
+def sales_by_store(supabase, start_date, end_date):
+    rows = _rpc(supabase, 'bill_charges_by_store', start_date, end_date)
+    df = pd.DataFrame(rows, columns=['store_name', 'total_amount', 'total_records'])
+    df['total_amount'] = df['total_amount'].astype(float) / CENTS
+    return df
+
+
+def sales_series(supabase, start_date, end_date, grain, store=None):
+    """Totals per period from the bill_charges_daily rollup; grain is 'day', 'week' or 'month'."""
+    params = {'range_start': start_date.isoformat(), 'range_end': end_date.isoformat(), 'grain': grain, 'store': store}
+    rows = supabase.rpc('bill_charges_series', params).execute().data
+    df = pd.DataFrame(rows, columns=['period', 'total_amount', 'total_records', 'paid_count'])
+    df['period'] = pd.to_datetime(df['period'])
+    df['total_amount'] = df['total_amount'].astype(float) / CENTS
+    return df.set_index('period')
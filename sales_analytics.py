@@ -0,0 +1,76 @@
+import hashlib
+import pandas as pd
+from sales_store import read_store
+
+DIMENSIONS = ['Unidade', 'Consultor', 'Procedimento']
+VALUE = 'Valor líquido'
+
+
+def file_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def prepare_sales(df):
+    """Keep the columns the cube uses, adding a normalized `day` column."""
+    df = pd.DataFrame({
+        'day': df['Data venda'].dt.normalize(),
+        'Unidade': df['Unidade'],
+        'Consultor': df['Consultor'],
+        'Procedimento': df['Procedimento'],
+        'ID orçamento': df['ID orçamento'],
+        VALUE: df[VALUE].fillna(0.0),
+    })
+    return df.sort_values('day', ignore_index=True)
+
+
+class SalesCube:
+    """Daily sales aggregates of the stored sales, so a date range is a slice-and-sum.
+
+    `daily[dim]` holds value and sale count per (day, dim). Distinct quotes per
+    consultant are not additive across days, so the (day, Consultor, quote)
+    triples are kept too and counted per range.
+    """
+
+    def __init__(self, sales):
+        self.daily = {
+            dim: (
+                sales.groupby(['day', dim], observed=True)[VALUE]
+                .agg(valor='sum', vendas='size')
+                .reset_index(dim)
+            )
+            for dim in DIMENSIONS
+        }
+        self.daily_totals = sales.groupby('day')[VALUE].agg(valor='sum', vendas='size')
+        self.consultor_quotes = (
+            sales[['day', 'Consultor', 'ID orçamento']]
+            .drop_duplicates()
+            .set_index('day')
+        )
+
+    @staticmethod
+    def _slice(frame, start_date, end_date):
+        return frame.loc[pd.Timestamp(start_date):pd.Timestamp(end_date)]
+
+    def totals(self, start_date, end_date):
+        """Return (total value, number of sales) between the two dates, inclusive."""
+        days = self._slice(self.daily_totals, start_date, end_date)
+        return days['valor'].sum(), int(days['vendas'].sum())
+
+    def by(self, dim, start_date, end_date):
+        """Value and sale count per `dim` between the two dates, largest value first."""
+        days = self._slice(self.daily[dim], start_date, end_date)
+        grouped = days.groupby(dim, observed=True)[['valor', 'vendas']].sum()
+        return grouped.sort_values('valor', ascending=False)
+
+    def consultor_stats(self, start_date, end_date):
+        """Total, distinct quotes and average sale per consultant, largest total first."""
+        stats = self.by('Consultor', start_date, end_date)
+        quotes = self._slice(self.consultor_quotes, start_date, end_date)
+        stats['quantidade'] = quotes.groupby('Consultor', observed=True)['ID orçamento'].nunique()
+        stats['media'] = stats['valor'] / stats['vendas']
+        return stats
+
+
+def build_store_cube(start_date, end_date):
+    """Cube over the stored uploads, reading only the sales between the two dates."""
+    return SalesCube(prepare_sales(read_store(start_date, end_date)))
@@ -0,0 +1,213 @@
+import json
+import os
+import threading
+import time
+from datetime import timedelta
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from excel_ingest import CATEGORY_COLUMNS, SALES_COLUMNS
+
+# Every upload merged into one Parquet dataset, one directory per sale month
+# (month=YYYY-MM/part.parquet). Names starting with '_' are skipped by readers.
+STORE_DIR = os.path.join(os.path.dirname(__file__), '.cache', 'sales_store')
+MANIFEST_NAME = '_uploads.json'
+KEY = 'ID orçamento'
+DATE = 'Data venda'
+# Daily totals per Unidade and Consultor, one file per month, rewritten with
+# the month's partition; trend views read these instead of the sales rows
+ROLLUP_DIR = '_daily'
+ROLLUP_KEYS = ['Unidade', 'Consultor']
+# Small row groups keep the Data venda statistics selective for pushdown
+ROW_GROUP_SIZE = 50_000
+
+_lock = threading.Lock()
+
+
+def _month_dir(store_dir, month):
+    return os.path.join(store_dir, f'month={month}')
+
+
+def _partition_path(store_dir, month):
+    return os.path.join(_month_dir(store_dir, month), 'part.parquet')
+
+
+def _months(store_dir):
+    if not os.path.isdir(store_dir):
+        return []
+    return sorted(name.split('=', 1)[1] for name in os.listdir(store_dir) if name.startswith('month='))
+
+
+def _normalized(df):
+    # Categories become plain strings on disk so partitions written from
+    # different uploads share one schema; quote IDs are text for the same reason
+    df = df.copy()
+    for column in CATEGORY_COLUMNS:
+        df[column] = df[column].astype('string')
+    df[KEY] = df[KEY].astype('string')
+    return df
+
+
+def _write_partition(store_dir, month, df):
+    path = _partition_path(store_dir, month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pandas(df.sort_values(DATE, ignore_index=True), preserve_index=False)
+    # Write then rename so readers never see a half-written partition; the
+    # temporary file starts with '.' so the dataset does not pick it up meanwhile
+    tmp = os.path.join(os.path.dirname(path), f'.{os.path.basename(path)}.tmp')
+    pq.write_table(table, tmp, row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp, path)
+
+
+def _rollup_path(store_dir, month):
+    return os.path.join(store_dir, ROLLUP_DIR, f'{month}.parquet')
+
+
+def _write_rollup(store_dir, month, sales):
+    daily = (
+        sales.assign(day=sales[DATE].dt.normalize())
+        .groupby(['day', *ROLLUP_KEYS], dropna=False)['Valor líquido']
+        .agg(valor='sum', vendas='size')
+        .reset_index()
+    )
+    path = _rollup_path(store_dir, month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    daily.to_parquet(f'{path}.tmp', index=False)
+    os.replace(f'{path}.tmp', path)
+
+
+def read_manifest(store_dir=STORE_DIR):
+    """Uploads merged so far, keyed by file hash."""
+    path = os.path.join(store_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_manifest(store_dir, manifest):
+    path = os.path.join(store_dir, MANIFEST_NAME)
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(f'{path}.tmp', path)
+
+
+def has_upload(upload_hash, store_dir=STORE_DIR):
+    return upload_hash in read_manifest(store_dir)
+
+
+def store_version(store_dir=STORE_DIR):
+    """Changes whenever an upload is merged; None while the store is empty."""
+    manifest = read_manifest(store_dir)
+    if not manifest:
+        return None
+    return max(entry['merged_at'] for entry in manifest.values())
+
+
+def add_upload(sales, upload_hash, name, store_dir=STORE_DIR):
+    """Merge the sales of one upload (as read by excel_ingest.read_sales_workbook) into the store.
+
+    Within the dates the upload covers, its rows replace the stored rows of
+    the same quotes (deduplicated on ID orçamento), so re-uploading overlapping
+    exports never double counts; stored rows of other quotes are kept. Only
+    month partitions receiving rows or holding those quotes within that span,
+    and their daily rollups, are rewritten. Returns the number
+    of stored rows replaced. An upload without sales is recorded with no
+    first or last sale.
+    """
+    sales = _normalized(sales)
+    keys = pa.array(sales[KEY].dropna().unique(), type=pa.string())
+    first, last = sales[DATE].min(), sales[DATE].max()
+    span = list(pd.period_range(first, last, freq='M').strftime('%Y-%m')) if len(sales) else []
+
+    incoming = {month: group for month, group in sales.groupby(sales[DATE].dt.strftime('%Y-%m'))}
+
+    with _lock:
+        # Stored months receiving rows are always merged with them; other months
+        # in the span are only rewritten if they hold any of these quotes, which
+        # is checked on the key column alone
+        touched = {}
+        for month in set(_months(store_dir)) & set(span):
+            if month not in incoming:
+                stored_keys = pq.read_table(_partition_path(store_dir, month), columns=[KEY])[KEY]
+                if not pc.any(pc.is_in(stored_keys, value_set=keys)).as_py():
+                    continue
+            touched[month] = pd.read_parquet(_partition_path(store_dir, month))
+
+        replaced = 0
+        for month in touched.keys() | incoming.keys():
+            frames = []
+            if month in touched:
+                stored = touched[month]
+                duplicate = stored[KEY].isin(sales[KEY]) & stored[DATE].between(first, last)
+                kept = stored[~duplicate]
+                replaced += len(stored) - len(kept)
+                frames.append(kept)
+            if month in incoming:
+                frames.append(incoming[month])
+            merged = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+            if merged.empty:
+                os.remove(_partition_path(store_dir, month))
+                os.rmdir(_month_dir(store_dir, month))
+                if os.path.exists(_rollup_path(store_dir, month)):
+                    os.remove(_rollup_path(store_dir, month))
+            else:
+                _write_partition(store_dir, month, merged)
+                _write_rollup(store_dir, month, merged)
+
+        manifest = read_manifest(store_dir)
+        manifest[upload_hash] = {
+            'name': name,
+            'rows': len(sales),
+            'first_sale': str(first) if len(sales) else None,
+            'last_sale': str(last) if len(sales) else None,
+            'merged_at': time.time(),
+        }
+        _write_manifest(store_dir, manifest)
+    return replaced
+
+
+def read_store(start_date, end_date, store_dir=STORE_DIR):
+    """Stored sales between the two dates (inclusive).
+
+    Month partitions outside the range are never opened and row groups are
+    skipped on their Data venda statistics.
+    """
+    if _months(store_dir):
+        dataset = ds.dataset(store_dir, format='parquet', partitioning='hive')
+        start, end = pd.Timestamp(start_date), pd.Timestamp(end_date + timedelta(days=1))
+        predicate = (
+            (ds.field('month') >= start.strftime('%Y-%m'))
+            & (ds.field('month') <= pd.Timestamp(end_date).strftime('%Y-%m'))
+            & (ds.field(DATE) >= start)
+            & (ds.field(DATE) < end)
+        )
+        df = dataset.to_table(columns=SALES_COLUMNS, filter=predicate).to_pandas()
+    else:
+        df = pd.DataFrame(columns=SALES_COLUMNS).astype({DATE: 'datetime64[ns]', 'Valor líquido': 'float64'})
+    for column in CATEGORY_COLUMNS:
+        df[column] = df[column].astype('category')
+    return df
+
+
+def read_rollup(start_date, end_date, store_dir=STORE_DIR):
+    """Daily value and sale count per Unidade and Consultor between the two dates."""
+    first, last = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    frames = []
+    for month in _months(store_dir):
+        if not first.strftime('%Y-%m') <= month <= last.strftime('%Y-%m'):
+            continue
+        path = _rollup_path(store_dir, month)
+        if not os.path.exists(path):
+            # Months stored before rollups existed are rolled up on first read
+            with _lock:
+                _write_rollup(store_dir, month, pd.read_parquet(_partition_path(store_dir, month)))
+        frames.append(pd.read_parquet(path))
+
+    if not frames:
+        return pd.DataFrame(columns=['day', *ROLLUP_KEYS, 'valor', 'vendas']).astype(
+            {'day': 'datetime64[ns]', 'valor': 'float64', 'vendas': 'int64'})
+    daily = pd.concat(frames, ignore_index=True)
+    return daily[daily['day'].between(first, last)].reset_index(drop=True)
@@ -0,0 +1,220 @@
+CREATE TABLE IF NOT EXISTS bill_charges (
+    id SERIAL PRIMARY KEY,
+    quote_id TEXT,
+    customer_id TEXT,
+    customer_name TEXT,
+    customer_taxvat TEXT,
+    customer_email TEXT,
+    store_name TEXT,
+    total_amount NUMERIC,
+    installments INTEGER,
+    paid_at TIMESTAMPTZ,
+    due_at TIMESTAMPTZ,
+    is_paid BOOLEAN,
+    payment_method TEXT,
+    status TEXT,
+    quote_items TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Natural key (quote_id|paid_at|due_at|amount) used to upsert instead of truncating
+ALTER TABLE bill_charges ADD COLUMN IF NOT EXISTS charge_key TEXT UNIQUE;
+-- Rows loaded before the key existed cannot be keyed exactly (the API's timestamp
+-- text is gone) and would sit next to their keyed copies; the next sync of each
+-- range reloads them
+DELETE FROM bill_charges WHERE charge_key IS NULL;
+
+-- High-water mark of each synced date range
+CREATE TABLE IF NOT EXISTS sync_state (
+    range_start DATE NOT NULL,
+    range_end DATE NOT NULL,
+    watermark TIMESTAMPTZ,
+    synced_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (range_start, range_end)
+);
+
+-- Report aggregates are computed in Postgres; the app only fetches the results
+CREATE INDEX IF NOT EXISTS bill_charges_paid_at_idx ON bill_charges (paid_at);
+CREATE INDEX IF NOT EXISTS bill_charges_store_name_paid_at_idx ON bill_charges (store_name, paid_at);
+
+-- Ranges are local days in api_timezone, the days the API's paidAtRange and
+-- publish_sync_job use, not the session's (UTC) days
+DROP FUNCTION IF EXISTS bill_charges_summary(DATE, DATE);
+CREATE OR REPLACE FUNCTION bill_charges_summary(range_start DATE, range_end DATE,
+                                                api_timezone TEXT DEFAULT 'America/Sao_Paulo')
+RETURNS TABLE (total_records BIGINT, total_amount NUMERIC, paid_count BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT COUNT(*), COALESCE(SUM(c.total_amount), 0), COUNT(*) FILTER (WHERE c.is_paid)
+    FROM bill_charges c
+    WHERE c.paid_at >= range_start::timestamp AT TIME ZONE api_timezone
+      AND c.paid_at < (range_end + 1)::timestamp AT TIME ZONE api_timezone
+$$;
+
+DROP FUNCTION IF EXISTS bill_charges_by_store(DATE, DATE);
+CREATE OR REPLACE FUNCTION bill_charges_by_store(range_start DATE, range_end DATE,
+                                                 api_timezone TEXT DEFAULT 'America/Sao_Paulo')
+RETURNS TABLE (store_name TEXT, total_amount NUMERIC, total_records BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT c.store_name, SUM(c.total_amount), COUNT(*)
+    FROM bill_charges c
+    WHERE c.paid_at >= range_start::timestamp AT TIME ZONE api_timezone
+      AND c.paid_at < (range_end + 1)::timestamp AT TIME ZONE api_timezone
+    GROUP BY c.store_name
+    ORDER BY 2 DESC
+$$;
+
+-- Superseded by bill_charges_series over the daily rollup
+DROP FUNCTION IF EXISTS bill_charges_by_day(DATE, DATE);
+
+-- Daily rollup of bill_charges per store and payment method. Each sync
+-- recomputes the days it touched, so trend reports read a few rows per day
+-- instead of every charge
+CREATE TABLE IF NOT EXISTS bill_charges_daily (
+    day DATE NOT NULL,
+    store_name TEXT NOT NULL DEFAULT '',
+    payment_method TEXT NOT NULL DEFAULT '',
+    total_amount NUMERIC NOT NULL,
+    total_records BIGINT NOT NULL,
+    paid_count BIGINT NOT NULL,
+    PRIMARY KEY (day, store_name, payment_method)
+);
+
+-- Days are local days in api_timezone, matching the synced ranges
+DROP FUNCTION IF EXISTS refresh_bill_charges_daily(DATE, DATE);
+CREATE OR REPLACE FUNCTION refresh_bill_charges_daily(range_start DATE, range_end DATE,
+                                                      api_timezone TEXT DEFAULT 'America/Sao_Paulo')
+RETURNS VOID
+LANGUAGE sql AS $$
+    DELETE FROM bill_charges_daily d WHERE d.day BETWEEN range_start AND range_end;
+    INSERT INTO bill_charges_daily (day, store_name, payment_method, total_amount, total_records, paid_count)
+    SELECT (c.paid_at AT TIME ZONE api_timezone)::date, COALESCE(c.store_name, ''), COALESCE(c.payment_method, ''),
+           COALESCE(SUM(c.total_amount), 0), COUNT(*), COUNT(*) FILTER (WHERE c.is_paid)
+    FROM bill_charges c
+    WHERE c.paid_at >= range_start::timestamp AT TIME ZONE api_timezone
+      AND c.paid_at < (range_end + 1)::timestamp AT TIME ZONE api_timezone
+    GROUP BY 1, 2, 3;
+$$;
+
+-- Totals per day, week or month (grain as accepted by date_trunc), optionally for one store
+CREATE OR REPLACE FUNCTION bill_charges_series(range_start DATE, range_end DATE, grain TEXT, store TEXT DEFAULT NULL)
+RETURNS TABLE (period DATE, total_amount NUMERIC, total_records BIGINT, paid_count BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT date_trunc(grain, d.day)::date, SUM(d.total_amount), SUM(d.total_records)::BIGINT, SUM(d.paid_count)::BIGINT
+    FROM bill_charges_daily d
+    WHERE d.day BETWEEN range_start AND range_end
+      AND (store IS NULL OR d.store_name = store)
+    GROUP BY 1
+    ORDER BY 1
+$$;
+
+-- Backfill the rollup for charges synced before it existed, or rebuild days
+-- bucketed in UTC by earlier versions (safe to re-run)
+SELECT refresh_bill_charges_daily(COALESCE(MIN(paid_at AT TIME ZONE 'America/Sao_Paulo')::date, CURRENT_DATE) - 1,
+                                  CURRENT_DATE + 1)
+FROM bill_charges;
+
+-- Sync jobs run by sync_worker.py; the dashboard only enqueues and polls them
+CREATE TABLE IF NOT EXISTS sync_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    range_start DATE NOT NULL,
+    range_end DATE NOT NULL,
+    incremental BOOLEAN NOT NULL DEFAULT TRUE,
+    status TEXT NOT NULL DEFAULT 'queued',
+    pages_done INTEGER NOT NULL DEFAULT 0,
+    pages_total INTEGER,
+    records INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    error TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    started_at TIMESTAMPTZ,
+    heartbeat_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ
+);
+
+-- At most one queued or running job per range, so concurrent clicks coalesce
+CREATE UNIQUE INDEX IF NOT EXISTS sync_jobs_active_range_idx
+    ON sync_jobs (range_start, range_end) WHERE status IN ('queued', 'running');
+
+-- Atomically hand the oldest queued job (or one whose worker stopped heartbeating) to a worker
+CREATE OR REPLACE FUNCTION claim_sync_job(stale_after INTERVAL DEFAULT '10 minutes')
+RETURNS SETOF sync_jobs
+LANGUAGE sql AS $$
+    UPDATE sync_jobs
+    SET status = 'running', started_at = NOW(), heartbeat_at = NOW(), error = NULL
+    WHERE id = (
+        SELECT id FROM sync_jobs
+        WHERE status = 'queued' OR (status = 'running' AND heartbeat_at < NOW() - stale_after)
+        ORDER BY created_at
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING *
+$$;
+
+-- Day shards each job has fully written, so a re-claimed or retried job resumes after them
+CREATE TABLE IF NOT EXISTS sync_job_shards (
+    job_id BIGINT NOT NULL REFERENCES sync_jobs (id) ON DELETE CASCADE,
+    shard_start DATE NOT NULL,
+    shard_end DATE NOT NULL,
+    records INTEGER NOT NULL DEFAULT 0,
+    done_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (job_id, shard_start, shard_end)
+);
+
+-- Full syncs write here and are published in one transaction when complete,
+-- so readers never see a range half reloaded
+CREATE TABLE IF NOT EXISTS bill_charges_staging (LIKE bill_charges INCLUDING DEFAULTS);
+ALTER TABLE bill_charges_staging
+    ADD COLUMN IF NOT EXISTS job_id BIGINT NOT NULL REFERENCES sync_jobs (id) ON DELETE CASCADE;
+CREATE UNIQUE INDEX IF NOT EXISTS bill_charges_staging_job_key_idx
+    ON bill_charges_staging (job_id, charge_key);
+
+-- Replace the range in bill_charges with a job's staged rows and refresh its rollup.
+-- The range is in the API's local days, so only rows the job fetched are deleted
+DROP FUNCTION IF EXISTS publish_sync_job(BIGINT, DATE, DATE);
+CREATE OR REPLACE FUNCTION publish_sync_job(staged_job BIGINT, range_start DATE, range_end DATE,
+                                            api_timezone TEXT DEFAULT 'America/Sao_Paulo')
+RETURNS BIGINT
+LANGUAGE plpgsql AS $$
+DECLARE
+    published BIGINT;
+BEGIN
+    DELETE FROM bill_charges c
+    WHERE c.paid_at >= range_start::timestamp AT TIME ZONE api_timezone
+      AND c.paid_at < (range_end + 1)::timestamp AT TIME ZONE api_timezone;
+
+    INSERT INTO bill_charges (charge_key, quote_id, customer_id, customer_name, customer_taxvat, customer_email,
+                              store_name, total_amount, installments, paid_at, due_at, is_paid, payment_method,
+                              status, quote_items)
+    SELECT s.charge_key, s.quote_id, s.customer_id, s.customer_name, s.customer_taxvat, s.customer_email,
+           s.store_name, s.total_amount, s.installments, s.paid_at, s.due_at, s.is_paid, s.payment_method,
+           s.status, s.quote_items
+    FROM bill_charges_staging s
+    WHERE s.job_id = staged_job
+    -- Charges whose paid_at moved into the range since they were stored
+    ON CONFLICT (charge_key) DO UPDATE SET
+        quote_id = EXCLUDED.quote_id, customer_id = EXCLUDED.customer_id,
+        customer_name = EXCLUDED.customer_name, customer_taxvat = EXCLUDED.customer_taxvat,
+        customer_email = EXCLUDED.customer_email, store_name = EXCLUDED.store_name,
+        total_amount = EXCLUDED.total_amount, installments = EXCLUDED.installments,
+        paid_at = EXCLUDED.paid_at, due_at = EXCLUDED.due_at, is_paid = EXCLUDED.is_paid,
+        payment_method = EXCLUDED.payment_method, status = EXCLUDED.status, quote_items = EXCLUDED.quote_items;
+    GET DIAGNOSTICS published = ROW_COUNT;
+
+    DELETE FROM bill_charges_staging s WHERE s.job_id = staged_job;
+    PERFORM refresh_bill_charges_daily(range_start - 1, range_end + 1, api_timezone);
+    RETURN published;
+END;
+$$;
+
+-- Failed jobs nobody retried; their staged rows and checkpoints go with them
+CREATE OR REPLACE FUNCTION purge_failed_sync_jobs(older_than INTERVAL DEFAULT '7 days')
+RETURNS BIGINT
+LANGUAGE sql AS $$
+    WITH purged AS (
+        DELETE FROM sync_jobs
+        WHERE status = 'failed' AND finished_at < NOW() - older_than
+        RETURNING id
+    )
+    SELECT COUNT(*) FROM purged
+$$;
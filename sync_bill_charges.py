@@ -0,0 +1,86 @@
+import time
+from datetime import datetime, timedelta
+from fetch_bill_charges import iter_bill_charges_sharded, SHARD_DAYS
+from ingest import ingest_bill_charges
+from bill_charges_store import get_watermark, save_watermark, refresh_daily_rollup
+from metrics import METRICS
+from range_planner import plan_shards
+from sync_jobs import get_checkpoints, save_checkpoint, publish_sync_job
+
+
+async def sync_bill_charges(supabase, session, start_date, end_date, token, status_placeholder,
+                            incremental=True, on_page=None, writer=None, cache=None,
+                            shard_days=SHARD_DAYS, job_id=None, staged=False):
+    """Upsert the charges paid between start_date and end_date into bill_charges.
+
+    In incremental mode only charges paid on or after the range's stored
+    watermark are fetched. The watermark's day and the one before are
+    re-fetched because the API filters by local date; the upsert on charge_key
+    makes the overlap harmless.
+    The range is fetched as concurrent date shards; with a ChargesCache closed
+    days are served from disk. The synced days are then recomputed in the
+    bill_charges_daily rollup.
+
+    With a `job_id`, each shard is checkpointed in sync_job_shards once its rows
+    are written, and shards checkpointed by an earlier, interrupted run of the
+    job are skipped. With `staged` the rows go to the job's slice of
+    bill_charges_staging (the writer must target STAGING_TABLE) and replace
+    the range in one transaction at the end. Returns the number of records
+    synced by this run.
+    """
+    if staged and (incremental or job_id is None):
+        raise ValueError("staged syncs must be full syncs of a job")
+
+    started = time.perf_counter()
+    fetch_from = start_date
+    watermark = None
+    if incremental:
+        watermark = get_watermark(supabase, start_date, end_date)
+        if watermark:
+            # The stored watermark is in UTC but the API filters by local day;
+            # starting a day early keeps the rest of the watermark's local day
+            watermark_day = datetime.fromisoformat(watermark).date()
+            fetch_from = max(start_date, watermark_day - timedelta(days=1))
+
+    # Max paid_at among the fetched records, in the API's own timestamp format
+    high_water = {'paid_at': None}
+
+    def track(page, last_page, columns):
+        paid_at = max(filter(None, columns['paid_at']), default=None)
+        if paid_at and (high_water['paid_at'] is None or paid_at > high_water['paid_at']):
+            high_water['paid_at'] = paid_at
+        if on_page is not None:
+            on_page(page, last_page, columns)
+
+    done, on_written = set(), None
+    if job_id is not None:
+        shards = plan_shards(fetch_from, end_date, shard_days)
+        done = get_checkpoints(supabase, job_id)
+        if done:
+            status_placeholder.info(f"↩️ Retomando: {len(done)} de {len(shards)} períodos já concluídos")
+
+        def on_written(number, total, records):
+            save_checkpoint(supabase, job_id, *shards[number - 1], len(records))
+
+    pages = iter_bill_charges_sharded(session, fetch_from, end_date, token, status_placeholder,
+                                      shard_days=shard_days, cache=cache, skip=done)
+    total_records = await ingest_bill_charges(supabase, pages, on_page=track, writer=writer,
+                                              extra_fields={'job_id': job_id} if staged else None,
+                                              on_written=on_written)
+
+    if staged:
+        publish_sync_job(supabase, job_id, start_date, end_date)
+    else:
+        # Roll up the synced days; one day of margin on each side covers charges
+        # the API placed in the range by a different day boundary than Postgres
+        refresh_daily_rollup(supabase, fetch_from - timedelta(days=1), end_date + timedelta(days=1))
+
+    # Only a completed sync moves the watermark forward
+    save_watermark(supabase, start_date, end_date, high_water['paid_at'] or watermark)
+
+    seconds = time.perf_counter() - started
+    METRICS.observe('sync_seconds', seconds)
+    METRICS.event('sync_finished', start_date=start_date, end_date=end_date, fetch_from=fetch_from,
+                  records=total_records, seconds=round(seconds, 3),
+                  rows_per_second=round(total_records / seconds, 1) if seconds else None)
+    return total_records
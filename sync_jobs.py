@@ -0,0 +1,127 @@
+from datetime import date, datetime, timezone
+from postgrest.exceptions import APIError
+from bill_charges_store import API_TIMEZONE
+from charges_cache import is_mutable_day
+
+ACTIVE_STATUSES = ('queued', 'running')
+UNIQUE_VIOLATION = '23505'
+# Full syncs are written here per job and published by publish_sync_job
+STAGING_TABLE = 'bill_charges_staging'
+STAGING_CONFLICT = 'job_id,charge_key'
+
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def get_job(supabase, job_id):
+    response = supabase.table('sync_jobs').select('*').eq('id', job_id).execute()
+    return response.data[0] if response.data else None
+
+
+def get_active_job(supabase, start_date, end_date):
+    response = (
+        supabase.table('sync_jobs')
+        .select('*')
+        .eq('range_start', start_date.isoformat())
+        .eq('range_end', end_date.isoformat())
+        .in_('status', list(ACTIVE_STATUSES))
+        .execute()
+    )
+    return response.data[0] if response.data else None
+
+
+def get_failed_job(supabase, start_date, end_date, incremental):
+    """The latest failed job for the range and mode, whose checkpoints a retry can reuse."""
+    response = (
+        supabase.table('sync_jobs')
+        .select('*')
+        .eq('range_start', start_date.isoformat())
+        .eq('range_end', end_date.isoformat())
+        .eq('incremental', incremental)
+        .eq('status', 'failed')
+        .order('created_at', desc=True)
+        .limit(1)
+        .execute()
+    )
+    return response.data[0] if response.data else None
+
+
+def enqueue_sync_job(supabase, start_date, end_date, incremental=True):
+    """Queue a sync for the range, or return the job already queued or running for it.
+
+    A failed job for the same range and mode is queued again rather than
+    replaced, so it resumes after its completed shards.
+    """
+    job = get_active_job(supabase, start_date, end_date)
+    if job is not None:
+        return job
+
+    failed = get_failed_job(supabase, start_date, end_date, incremental)
+    try:
+        if failed is not None:
+            response = (
+                supabase.table('sync_jobs')
+                .update({'status': 'queued', 'error': None, 'finished_at': None})
+                .eq('id', failed['id'])
+                .eq('status', 'failed')
+                .execute()
+            )
+            if response.data:
+                return response.data[0]
+        response = supabase.table('sync_jobs').insert({
+            'range_start': start_date.isoformat(),
+            'range_end': end_date.isoformat(),
+            'incremental': incremental,
+        }).execute()
+    except APIError as e:
+        # Someone else enqueued the same range between our select and insert
+        if e.code != UNIQUE_VIOLATION:
+            raise
+        return get_active_job(supabase, start_date, end_date)
+    return response.data[0]
+
+
+def claim_sync_job(supabase):
+    """Mark the next runnable job as running and return it, or None if the queue is empty."""
+    response = supabase.rpc('claim_sync_job', {}).execute()
+    return response.data[0] if response.data else None
+
+
+def update_sync_job(supabase, job_id, **fields):
+    supabase.table('sync_jobs').update(fields).eq('id', job_id).execute()
+
+
+def get_checkpoints(supabase, job_id):
+    """(shard_start, shard_end) date pairs the job has fully written and need not fetch again.
+
+    Shards reaching a mutable day are left out, since charges may have been
+    paid on it since the checkpoint was written.
+    """
+    response = supabase.table('sync_job_shards').select('shard_start,shard_end').eq('job_id', job_id).execute()
+    shards = {(date.fromisoformat(row['shard_start']), date.fromisoformat(row['shard_end'])) for row in response.data}
+    return {shard for shard in shards if not is_mutable_day(shard[1])}
+
+
+def save_checkpoint(supabase, job_id, shard_start, shard_end, records):
+    supabase.table('sync_job_shards').upsert({
+        'job_id': job_id,
+        'shard_start': shard_start.isoformat(),
+        'shard_end': shard_end.isoformat(),
+        'records': records,
+    }).execute()
+
+
+def publish_sync_job(supabase, job_id, start_date, end_date):
+    """Swap the job's staged rows in for the range in one transaction; returns rows published."""
+    return supabase.rpc('publish_sync_job', {
+        'staged_job': job_id,
+        'range_start': start_date.isoformat(),
+        'range_end': end_date.isoformat(),
+        'api_timezone': API_TIMEZONE,
+    }).execute().data
+
+
+def purge_failed_sync_jobs(supabase):
+    """Delete failed jobs nobody retried, with their staged rows and checkpoints."""
+    supabase.rpc('purge_failed_sync_jobs', {}).execute()
@@ -0,0 +1,173 @@
+"""Background worker that runs queued bill charge syncs outside Streamlit.
+
+Usage:
+    python sync_worker.py                       # poll sync_jobs forever
+    python sync_worker.py --once                # run at most one queued job
+    python sync_worker.py --enqueue 2024-11-01 2024-11-30 [--full]
+    python sync_worker.py --once --profile sync  # also write sync.prof and log hotspots
+
+Metrics are written in Prometheus text format to .cache/metrics.prom after
+each job (see --metrics-file).
+
+Reads SUPABASE_URL, SUPABASE_KEY and TOKEN from the environment or a .env file.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from datetime import date
+from dotenv import load_dotenv
+from supabase import create_client
+from bulk_writer import BulkWriter
+from charges_cache import ChargesCache
+from fetch_graphql import create_session
+from metrics import METRICS, METRICS_PATH, profile_sync
+from sync_bill_charges import sync_bill_charges
+from sync_jobs import (
+    claim_sync_job, enqueue_sync_job, update_sync_job, now_iso, get_checkpoints, purge_failed_sync_jobs,
+    STAGING_TABLE, STAGING_CONFLICT
+)
+
+logger = logging.getLogger('sync_worker')
+
+POLL_INTERVAL = 5.0
+# Seconds between sweeps of failed jobs left with staged rows
+PURGE_INTERVAL = 3600.0
+# Minimum seconds between progress writes to sync_jobs
+PROGRESS_INTERVAL = 1.0
+
+
+class JobStatus:
+    """Stands in for the Streamlit status placeholder, reporting into the job row."""
+
+    def __init__(self, supabase, job_id):
+        self.supabase = supabase
+        self.job_id = job_id
+        self.pages_done = 0
+        self.records = 0
+        self._message = None
+        self._written_at = 0.0
+
+    def _write(self, force=False, **fields):
+        now = time.monotonic()
+        if not force and now - self._written_at < PROGRESS_INTERVAL:
+            return
+        self._written_at = now
+        update_sync_job(self.supabase, self.job_id, message=self._message, pages_done=self.pages_done,
+                        records=self.records, heartbeat_at=now_iso(), **fields)
+
+    def _report(self, level, message, force=False):
+        logger.log(level, "job %s: %s", self.job_id, message)
+        self._message = message
+        self._write(force)
+
+    def info(self, message):
+        self._report(logging.INFO, message)
+
+    def success(self, message):
+        self._report(logging.INFO, message, force=True)
+
+    def warning(self, message):
+        self._report(logging.WARNING, message, force=True)
+
+    def error(self, message):
+        self._report(logging.ERROR, message, force=True)
+
+    def on_page(self, page, last_page, columns):
+        self.pages_done += 1
+        self.records += len(columns['charge_key'])
+        self._write(pages_total=last_page)
+
+
+async def run_job(supabase, job, token):
+    start_date = date.fromisoformat(job['range_start'])
+    end_date = date.fromisoformat(job['range_end'])
+    status = JobStatus(supabase, job['id'])
+    # A re-claimed or retried job picks up after the shards it already wrote
+    status.pages_done = len(get_checkpoints(supabase, job['id']))
+    # Full reloads are staged and swapped in at the end; incremental syncs upsert in place
+    staged = not job['incremental']
+    if staged:
+        writer = BulkWriter(supabase, table=STAGING_TABLE, on_conflict=STAGING_CONFLICT)
+    else:
+        writer = BulkWriter(supabase)
+    logger.info("job %s: syncing %s to %s", job['id'], start_date, end_date)
+
+    try:
+        async with create_session() as session:
+            total = await sync_bill_charges(
+                supabase, session, start_date, end_date, token, status,
+                incremental=job['incremental'], on_page=status.on_page, writer=writer,
+                cache=ChargesCache(), job_id=job['id'], staged=staged
+            )
+    except Exception as e:
+        logger.exception("job %s failed", job['id'])
+        update_sync_job(supabase, job['id'], status='failed', error=str(e), finished_at=now_iso())
+        return False
+    finally:
+        writer.close()
+
+    status.records = total
+    status.success(f"✅ {total} registros sincronizados a {writer.rows_per_second:,.0f} registros/s")
+    update_sync_job(supabase, job['id'], status='done', finished_at=now_iso())
+    return True
+
+
+def run_worker(supabase, token, once=False, poll_interval=POLL_INTERVAL, metrics_file=METRICS_PATH):
+    purged_at = None
+    while True:
+        if purged_at is None or time.monotonic() - purged_at >= PURGE_INTERVAL:
+            purge_failed_sync_jobs(supabase)
+            purged_at = time.monotonic()
+        job = claim_sync_job(supabase)
+        if job is not None:
+            started = time.perf_counter()
+            ok = asyncio.run(run_job(supabase, job, token))
+            METRICS.inc('sync_jobs', status='done' if ok else 'failed')
+            METRICS.event('sync_job_finished', job_id=job['id'], ok=ok,
+                          seconds=round(time.perf_counter() - started, 3), metrics=METRICS.snapshot())
+            if metrics_file:
+                METRICS.write_file(metrics_file)
+        if once:
+            return
+        if job is None:
+            time.sleep(poll_interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run queued bill charge syncs into Supabase.")
+    parser.add_argument('--once', action='store_true', help="run at most one queued job and exit")
+    parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL,
+                        help="seconds to wait between polls of an empty queue")
+    parser.add_argument('--enqueue', nargs=2, metavar=('START', 'END'),
+                        help="queue a sync for the date range (YYYY-MM-DD) and exit")
+    parser.add_argument('--full', action='store_true', help="with --enqueue, re-fetch the whole range")
+    parser.add_argument('--metrics-file', default=METRICS_PATH,
+                        help="Prometheus text file rewritten after each job ('' to disable)")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="profile the run with cProfile and tracemalloc, writing PATH.prof")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    load_dotenv()
+    supabase = create_client(os.environ['SUPABASE_URL'], os.environ['SUPABASE_KEY'])
+
+    if args.enqueue:
+        start_date, end_date = (date.fromisoformat(value) for value in args.enqueue)
+        job = enqueue_sync_job(supabase, start_date, end_date, incremental=not args.full)
+        logger.info("job %s is %s", job['id'], job['status'])
+        return
+
+    if args.profile:
+        with profile_sync(args.profile):
+            run_worker(supabase, os.environ['TOKEN'], once=args.once, poll_interval=args.poll_interval,
+                       metrics_file=args.metrics_file)
+        return
+
+    run_worker(supabase, os.environ['TOKEN'], once=args.once, poll_interval=args.poll_interval,
+               metrics_file=args.metrics_file)
+
+
+if __name__ == '__main__':
+    main()
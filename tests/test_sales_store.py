@@ -0,0 +1,55 @@
+from datetime import date
+
+import pandas as pd
+
+import sales_store
+
+
+def make_sales(rows):
+    """Sales as read by read_sales_workbook from (quote id, day, value) triples."""
+    df = pd.DataFrame({
+        'Data venda': pd.to_datetime([day for _, day, _ in rows]),
+        'Status': 'Finalizado',
+        'Consultor': 'Ana',
+        'Unidade': 'Centro',
+        'Procedimento': 'Limpeza',
+        'Valor líquido': [value for _, _, value in rows],
+        'ID orçamento': pd.array([quote for quote, _, _ in rows], dtype='Int64'),
+    })
+    for column in sales_store.CATEGORY_COLUMNS:
+        df[column] = df[column].astype('category')
+    return df
+
+
+def stored(store_dir):
+    df = sales_store.read_store(date(2024, 1, 1), date(2024, 12, 31), store_dir)
+    return dict(zip(df['ID orçamento'].astype(int), df['Valor líquido']))
+
+
+def test_disjoint_uploads_to_the_same_month_are_kept(tmp_path):
+    sales_store.add_upload(make_sales([(1, '2024-01-05', 10.0), (2, '2024-01-05', 20.0), (3, '2024-01-05', 30.0)]),
+                           'h1', 'semana1.xlsx', tmp_path)
+    replaced = sales_store.add_upload(make_sales([(4, '2024-01-20', 40.0), (5, '2024-01-20', 50.0)]),
+                                      'h2', 'semana3.xlsx', tmp_path)
+
+    assert replaced == 0
+    assert stored(tmp_path) == {1: 10.0, 2: 20.0, 3: 30.0, 4: 40.0, 5: 50.0}
+    rollup = sales_store.read_rollup(date(2024, 1, 1), date(2024, 1, 31), tmp_path)
+    assert rollup['vendas'].sum() == 5
+
+
+def test_overlapping_reupload_replaces_only_its_quotes(tmp_path):
+    sales_store.add_upload(make_sales([(1, '2024-01-05', 10.0), (2, '2024-01-25', 20.0), (3, '2024-02-10', 30.0)]),
+                           'h1', 'jan-fev.xlsx', tmp_path)
+    replaced = sales_store.add_upload(make_sales([(1, '2024-01-05', 15.0), (2, '2024-01-25', 25.0)]),
+                                      'h2', 'jan.xlsx', tmp_path)
+
+    assert replaced == 2
+    assert stored(tmp_path) == {1: 15.0, 2: 25.0, 3: 30.0}
+
+
+def test_quote_outside_the_upload_dates_is_not_replaced(tmp_path):
+    sales_store.add_upload(make_sales([(1, '2024-01-05', 10.0)]), 'h1', 'jan.xlsx', tmp_path)
+    sales_store.add_upload(make_sales([(1, '2024-03-05', 12.0)]), 'h2', 'mar.xlsx', tmp_path)
+
+    assert len(sales_store.read_store(date(2024, 1, 1), date(2024, 12, 31), tmp_path)) == 2
@@ -0,0 +1,44 @@
+from transform import raw_charge_key, to_records, transform_charges
+
+
+def make_charge(quote_id, amount, paid_at='2024-03-01T10:00:00-03:00'):
+    return {
+        'quote': {
+            'id': quote_id,
+            'customer': {'id': 'c1', 'name': 'Cliente', 'taxvat': None, 'email': None},
+            'status': 'approved',
+            'bill': {'total': amount, 'installmentsQuantity': 1, 'items': []},
+        },
+        'store': {'name': 'Loja'},
+        'amount': amount,
+        'paidAt': paid_at,
+        'dueAt': None,
+        'isPaid': True,
+        'paymentMethod': {'name': 'pix'},
+    }
+
+
+def keys_and_amounts(charges):
+    records = to_records(transform_charges(charges))
+    return {record['quote_id']: (record['charge_key'], record['total_amount']) for record in records}
+
+
+def test_charge_key_does_not_depend_on_the_rest_of_the_page():
+    charge = make_charge('q1', 1000)
+    alone = keys_and_amounts([charge])['q1']
+
+    for neighbour in (make_charge('q2', None), make_charge('q2', 99.5)):
+        assert keys_and_amounts([charge, neighbour])['q1'] == alone
+
+
+def test_charge_key_matches_the_shard_deduplication_key():
+    charges = [make_charge('q1', 1000), make_charge('q2', 99.5), make_charge('q3', None, paid_at=None)]
+    records = to_records(transform_charges(charges))
+    assert [record['charge_key'] for record in records] == [raw_charge_key(charge) for charge in charges]
+
+
+def test_amounts_are_normalized_one_by_one():
+    amounts = keys_and_amounts([make_charge('q1', 1000.0), make_charge('q2', 99.5), make_charge('q3', None)])
+    assert amounts['q1'][1] == 1000 and isinstance(amounts['q1'][1], int)
+    assert amounts['q2'][1] == 99.5
+    assert amounts['q3'][1] is None
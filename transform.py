@@ -0,0 +1,70 @@
+import orjson
+import pandas as pd
+
+# Flattened GraphQL field -> bill_charges column
+FIELD_COLUMNS = {
+    'quote.id': 'quote_id',
+    'quote.customer.id': 'customer_id',
+    'quote.customer.name': 'customer_name',
+    'quote.customer.taxvat': 'customer_taxvat',
+    'quote.customer.email': 'customer_email',
+    'store.name': 'store_name',
+    'amount': 'total_amount',
+    'quote.bill.installmentsQuantity': 'installments',
+    'paidAt': 'paid_at',
+    'dueAt': 'due_at',
+    'isPaid': 'is_paid',
+    'paymentMethod.name': 'payment_method',
+    'quote.status': 'status',
+}
+
+RECORD_COLUMNS = ['charge_key'] + list(FIELD_COLUMNS.values()) + ['quote_items']
+
+
+def charge_key(quote_id, paid_at, due_at, amount):
+    return f"{quote_id}|{paid_at or ''}|{due_at or ''}|{amount}"
+
+
+def raw_charge_key(charge):
+    """charge_key of one raw GraphQL charge, independent of the page it arrived in."""
+    return charge_key(charge['quote']['id'], charge.get('paidAt'), charge.get('dueAt'), charge.get('amount'))
+
+
+def _amount(value):
+    # Integral amounts are stored as int one by one, so a value never depends on its neighbours
+    if value is None or isinstance(value, bool) or not float(value).is_integer():
+        return value
+    return int(value)
+
+
+def _to_list(series):
+    # Plain Python values with None for missing, as PostgREST expects
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def transform_charges(charges):
+    """Flatten a page (or a whole range) of raw charges into bill_charges columns.
+
+    Returns a dict of column name -> list, one entry per charge.
+    """
+    if not charges:
+        return {column: [] for column in RECORD_COLUMNS}
+
+    df = pd.json_normalize(charges).reindex(columns=list(FIELD_COLUMNS) + ['quote.bill.items'])
+    df = df.rename(columns=FIELD_COLUMNS)
+
+    # Keep integer columns integral even when some values are missing
+    df['installments'] = df['installments'].astype('Int64')
+
+    columns = {column: _to_list(df[column]) for column in FIELD_COLUMNS.values()}
+    columns['total_amount'] = [_amount(value) for value in columns['total_amount']]
+    # Keys come from the raw values so a charge gets the same key in any page
+    columns['charge_key'] = [raw_charge_key(charge) for charge in charges]
+    columns['quote_items'] = [orjson.dumps(items).decode() for items in df['quote.bill.items']]
+    return {column: columns[column] for column in RECORD_COLUMNS}
+
+
+def to_records(columns):
+    """Turn transform_charges output into the list of row dicts PostgREST inserts."""
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*columns.values())]
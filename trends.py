@@ -0,0 +1,43 @@
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+
+# Report grains as shown in the apps, and their date_trunc names
+GRAINS = {'Diário': 'day', 'Semanal': 'week', 'Mensal': 'month'}
+# Period starts matching Postgres date_trunc: weeks begin on Monday
+FREQUENCIES = {'day': 'D', 'week': 'W-MON', 'month': 'MS'}
+PERIODS = {'day': 'D', 'week': 'W-SUN', 'month': 'M'}
+
+
+def previous_range(start_date, end_date):
+    """The range of the same length ending the day before start_date."""
+    length = end_date - start_date + timedelta(days=1)
+    return start_date - length, start_date - timedelta(days=1)
+
+
+def resample(daily, grain):
+    """Sum a day-indexed frame into periods starting on their first day."""
+    return daily.resample(FREQUENCIES[grain], label='left', closed='left').sum()
+
+
+def with_deltas(series, columns):
+    """Add a `<column> Δ%` change against the previous period for each column."""
+    series = series.copy()
+    for column in columns:
+        # A period after an empty one has no meaningful change
+        delta = series[column].pct_change(fill_method=None).replace([np.inf, -np.inf], np.nan)
+        series[f'{column} Δ%'] = (delta * 100).round(1)
+    return series
+
+
+def change(current, previous):
+    """Percentage change for st.metric deltas; None when there is no base."""
+    if not previous:
+        return None
+    return f"{(current / previous - 1) * 100:+.1f}%"
+
+
+def full_periods(series, start_date, end_date, grain):
+    """Reindex a period-indexed frame so periods without sales show as zero."""
+    first = pd.Timestamp(start_date).to_period(PERIODS[grain]).start_time
+    return series.reindex(pd.date_range(first, pd.Timestamp(end_date), freq=FREQUENCIES[grain]), fill_value=0)